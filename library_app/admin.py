@@ -1,9 +1,13 @@
+from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
 from simple_history.admin import SimpleHistoryAdmin
 
-from .models import User, Book, Borrowing, HistoricalBook
+from .facets import book_filter
+from .models import Author, User, Book, Borrowing, Copy, Genre, HistoricalBook
+from .search import search_books
+from .services import add_copies, refresh_copy_counts
 
 
 @admin.register(User)
@@ -28,24 +32,95 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+@admin.register(Author, Genre)
+class CatalogNameAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+    ordering = ('name',)
+
+
+class AvailableListFilter(admin.SimpleListFilter):
+    title = 'available'
+    parameter_name = 'available'
+
+    def lookups(self, request, model_admin):
+
+        return (('yes', 'Yes'), ('no', 'No'))
+
+    def queryset(self, request, queryset):
+
+        if self.value() in ('yes', 'no'):
+
+            return queryset.filter(book_filter('available', self.value() == 'yes'))
+
+        return queryset
+
+
+class CopyInline(admin.TabularInline):
+    model = Copy
+    extra = 0
+
+    # Copies have nothing to fill in; they are added with the book form's "add copies" field.
+    def has_add_permission(self, request, obj=None):
+
+        return False
+
+
+class BookAdminForm(forms.ModelForm):
+    add_copies = forms.IntegerField(min_value=0, max_value=100, required=False, initial=0,
+                                    help_text='Number of new copies to add.')
+
+    class Meta:
+        model = Book
+        fields = '__all__'
+
+
 @admin.register(Book)
 class BookAdmin(SimpleHistoryAdmin):
-    list_display = ('title', 'author', 'genre', 'is_checked_out')
-    search_fields = ('title', 'author', 'genre')
-    list_filter = ('genre', 'is_checked_out')
+    form = BookAdminForm
+    inlines = [CopyInline]
+    list_display = ('title', 'author', 'genre', 'available_copies', 'total_copies')
+    list_select_related = ('author', 'genre')
+    search_fields = ('title', 'author__name', 'genre__name')
+    list_filter = ('genre', AvailableListFilter)
+    autocomplete_fields = ('author', 'genre')
+    readonly_fields = ('total_copies', 'available_copies')
     ordering = ('title',)
 
+    def get_changeform_initial_data(self, request):
+
+        return {'add_copies': 1, **super().get_changeform_initial_data(request)}
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        book = form.instance
+
+        if any(formset.deleted_objects for formset in formsets):
+            refresh_copy_counts(Book.objects.filter(pk=book.pk))
+
+        if form.cleaned_data.get('add_copies'):
+            add_copies([book.pk], form.cleaned_data['add_copies'])
+
+    def get_search_results(self, request, queryset, search_term):
+
+        if not search_term.strip():
+
+            return queryset, False
+
+        return search_books(search_term, queryset), False
+
 
 @admin.register(Borrowing)
 class BorrowingAdmin(admin.ModelAdmin):
-    list_display = ('reader', 'book', 'borrowed_date', 'returned_date')
+    list_display = ('reader', 'book', 'copy', 'borrowed_date', 'returned_date')
+    raw_id_fields = ('copy',)
     search_fields = ('reader__user__username', 'book__title')
     list_filter = ('borrowed_date', 'returned_date')
     ordering = ('-borrowed_date',)
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        queryset = queryset.select_related('reader', 'book')
+        queryset = queryset.select_related('reader', 'book', 'copy__book')
 
         return queryset
 
@@ -0,0 +1,152 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import Reader, User
+
+
+READER_ID_CLAIM = 'reader_id'
+
+
+class UserCache:
+    """
+    Small thread-safe LRU cache with a per-entry time to live.
+
+    It lives in process memory, so entries evicted in one worker stay valid in
+    the others until their TTL runs out.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+
+                return None
+
+            value, expires = entry
+
+            if expires <= time.monotonic():
+                del self.entries[key]
+
+                return None
+
+            self.entries.move_to_end(key)
+
+            return value
+
+    def set(self, key, value):
+
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL)
+
+
+class LibraryTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Embed the user's roles and reader profile in the tokens so API views need not look them up."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['is_reader'] = user.is_reader
+        token['is_librarian'] = user.is_librarian
+        token[READER_ID_CLAIM] = Reader.objects.filter(user=user).values_list('pk', flat=True).first()
+
+        return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that keeps recently seen users in ``user_cache``.
+
+    Saving or deleting a user evicts it (see ``signals.py``), so deactivating an
+    account takes effect immediately in this process and within
+    ``AUTH_USER_CACHE_TTL`` seconds in the others.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user = user_cache.get(user_id)
+
+        if user is None:
+            user = super().get_user(validated_token)
+            # Checked against the token's reader claim by token_reader(); deleting the reader evicts the user.
+            user.reader_pk = Reader.objects.filter(user=user).values_list('pk', flat=True).first()
+            user_cache.set(user_id, user)
+
+        if not user.is_active:
+            user_cache.delete(user_id)
+
+            return super().get_user(validated_token)
+
+        # Views may set attributes on request.user; keep the cached instance clean.
+        return copy.copy(user)
+
+
+def token_reader(request):
+    """
+    Return the ``Reader`` named by the access token's claims without a query.
+
+    Returns ``None`` when the request was not authenticated by a token carrying
+    a reader id: session or forced authentication, tokens issued before the
+    claim existed, and users who had no reader profile at issue time. The claim
+    must match the reader loaded with the cached user, so tokens outliving their
+    reader profile are not trusted.
+    """
+
+    token = getattr(request, 'auth', None)
+
+    if token is None or not hasattr(token, 'get') or token.get(READER_ID_CLAIM) is None:
+
+        return None
+
+    if getattr(request.user, 'reader_pk', None) != token[READER_ID_CLAIM]:
+
+        return None
+
+    return Reader(pk=token[READER_ID_CLAIM])
+
+
+class ReaderModelBackend(ModelBackend):
+    """``ModelBackend`` that loads the reader profile in the same query as the session user."""
+
+    def get_user(self, user_id):
+
+        try:
+            user = User._default_manager.select_related('reader').get(pk=user_id)
+        except User.DoesNotExist:
+
+            return None
+
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+
+
+CATALOG_VERSION_KEY = 'library:catalog-version'
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+
+    if version is None:
+        version = bump_catalog_version()
+
+    return version
+
+
+async def aget_catalog_version():
+    """``get_catalog_version()`` for async views, without blocking the event loop on the cache."""
+
+    version = await cache.aget(CATALOG_VERSION_KEY)
+
+    if version is None:
+        version = time.time_ns()
+        await cache.aset(CATALOG_VERSION_KEY, version, timeout=None)
+
+    return version
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog response.
+
+    The version is the bump time in nanoseconds. Catalog responses carry no
+    Last-Modified date: at its one-second resolution two changes within the same
+    second would look unmodified, so conditional requests rely on the ETag.
+    Queryset ``update()``/``bulk_create()`` skip the model signals and must call
+    this explicitly.
+    """
+
+    version = time.time_ns()
+    cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+
+    return version
+
+
+# The key functions look the version up unless given one; async views pass the one from aget_catalog_version().
+
+def catalog_cache_key(request, version=None):
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+
+    return f'library:catalog:{version or get_catalog_version()}:{url}'
+
+
+def catalog_etag(request, *args, version=None, **kwargs):
+
+    return hashlib.md5(catalog_cache_key(request, version).encode()).hexdigest()
+
+
+def catalog_facets_cache_key(filters, facets, version=None):
+    """Facet counts depend on the filters only, so every page of a filtered list shares them."""
+
+    params = hashlib.md5(json.dumps([filters, facets], sort_keys=True).encode()).hexdigest()
+
+    return f'library:catalog:{version or get_catalog_version()}:facets:{params}'
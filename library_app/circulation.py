@@ -0,0 +1,280 @@
+import operator
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .expressions import days_since
+from .models import (Book, BookCirculation, BookDailyStats, Borrowing, CirculationSnapshot, GenreDailyStats,
+                     LoanCirculation, Reader, ReaderCirculation)
+
+
+# Loans are picked up by updated_at, which is set when the statement runs, not when its
+# transaction commits. Re-reading this far back covers transactions that were still open at
+# the previous refresh; recomputing a reader or book twice is harmless.
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+def snapshot_time():
+
+    return CirculationSnapshot.objects.values_list('refreshed_at', flat=True).first()
+
+
+def refresh_readers(reader_ids):
+    rows = (
+        Borrowing.objects.filter(reader_id__in=reader_ids, returned_date__isnull=True)
+        .values('reader_id')
+        .annotate(open_loans=Count('id'), oldest_borrowed_date=Min('borrowed_date'))
+        .order_by()
+    )
+    snapshots = [ReaderCirculation(**row) for row in rows]
+    ReaderCirculation.objects.filter(reader_id__in=reader_ids).exclude(
+        reader_id__in=[snapshot.reader_id for snapshot in snapshots]
+    ).delete()
+    ReaderCirculation.objects.bulk_create(snapshots, update_conflicts=True, unique_fields=['reader'],
+                                          update_fields=['open_loans', 'oldest_borrowed_date'])
+
+
+def refresh_books(book_ids):
+    rows = (
+        Borrowing.objects.filter(book_id__in=book_ids)
+        .values('book_id')
+        .annotate(loan_count=Count('id'), last_returned_date=Max('returned_date'))
+        .order_by()
+    )
+    snapshots = [BookCirculation(**row) for row in rows]
+    BookCirculation.objects.filter(book_id__in=book_ids).exclude(
+        book_id__in=[snapshot.book_id for snapshot in snapshots]
+    ).delete()
+    BookCirculation.objects.bulk_create(snapshots, update_conflicts=True, unique_fields=['book'],
+                                        update_fields=['loan_count', 'last_returned_date'])
+    # A book lends several copies at once, so its open loans are replaced as a whole.
+    LoanCirculation.objects.filter(book_id__in=book_ids).delete()
+    LoanCirculation.objects.bulk_create(
+        LoanCirculation(borrowing_id=borrowing_id, book_id=book_id, reader_id=reader_id, borrowed_date=borrowed_date)
+        for borrowing_id, book_id, reader_id, borrowed_date in Borrowing.objects.filter(
+            book_id__in=book_ids, returned_date__isnull=True
+        ).values_list('id', 'book_id', 'reader_id', 'borrowed_date')
+    )
+
+
+STATS_FIELDS = ['loans', 'returns', 'loan_days']
+
+
+def cells_filter(key, cells):
+
+    return reduce(operator.or_, (Q(**{key: value, 'day': day}) for value, day in cells))
+
+
+def refresh_book_stats(days_by_book):
+    """
+    Recompute ``BookDailyStats`` for the given days of each book.
+
+    Returns the ``(genre, day)`` pairs whose totals may have changed.
+    """
+
+    stats = {(book_id, day): dict.fromkeys(STATS_FIELDS, 0) for book_id, days in days_by_book.items() for day in days}
+    first_day = min(day for _, day in stats)
+    last_day = max(day for _, day in stats)
+    loans = Borrowing.objects.filter(
+        Q(borrowed_date__range=(first_day, last_day)) | Q(returned_date__range=(first_day, last_day)),
+        book_id__in=days_by_book,
+    ).values_list('book_id', 'borrowed_date', 'returned_date')
+
+    # Loans can fall on days of the batch that were not asked for; those are left alone.
+    for book_id, borrowed_date, returned_date in loans:
+
+        if (book_id, borrowed_date) in stats:
+            stats[book_id, borrowed_date]['loans'] += 1
+
+        if (book_id, returned_date) in stats:
+            cell = stats[book_id, returned_date]
+            cell['returns'] += 1
+            cell['loan_days'] += (returned_date - borrowed_date).days
+
+    empty = [cell for cell, values in stats.items() if not any(values.values())]
+
+    if empty:
+        BookDailyStats.objects.filter(cells_filter('book_id', empty)).delete()
+
+    BookDailyStats.objects.bulk_create(
+        [BookDailyStats(book_id=book_id, day=day, **values)
+         for (book_id, day), values in stats.items() if any(values.values())],
+        update_conflicts=True, unique_fields=['book', 'day'], update_fields=STATS_FIELDS,
+    )
+    genres = dict(Book.objects.filter(id__in=days_by_book).values_list('id', 'genre_id'))
+
+    return {(genres[book_id], day) for book_id, day in stats if book_id in genres}
+
+
+def genre_stats_rows(queryset):
+
+    return (
+        queryset.values_list('book__genre_id', 'day')
+        .annotate(*[Sum(field) for field in STATS_FIELDS])
+        .order_by()
+    )
+
+
+def refresh_genre_stats(cells):
+    genres = {genre for genre, _ in cells}
+    days = {day for _, day in cells}
+    rows = genre_stats_rows(BookDailyStats.objects.filter(book__genre_id__in=genres, day__in=days))
+    stats = {(genre, day): values for genre, day, *values in rows if (genre, day) in cells}
+    empty = [cell for cell in cells if cell not in stats]
+
+    if empty:
+        GenreDailyStats.objects.filter(cells_filter('genre_id', empty)).delete()
+
+    GenreDailyStats.objects.bulk_create(
+        [GenreDailyStats(genre_id=genre, day=day, **dict(zip(STATS_FIELDS, values)))
+         for (genre, day), values in stats.items()],
+        update_conflicts=True, unique_fields=['genre', 'day'], update_fields=STATS_FIELDS,
+    )
+
+
+def rebuild_genre_stats(batch_size):
+    rows = genre_stats_rows(BookDailyStats.objects.all())
+    GenreDailyStats.objects.bulk_create(
+        [GenreDailyStats(genre_id=genre, day=day, **dict(zip(STATS_FIELDS, values))) for genre, day, *values in rows],
+        batch_size=batch_size,
+    )
+
+
+def batches(items, batch_size):
+    items = sorted(items)
+
+    for start in range(0, len(items), batch_size):
+
+        yield items[start:start + batch_size]
+
+
+def refresh_snapshot(full=False, batch_size=1000):
+    """
+    Recompute the circulation snapshot and daily statistics touched by loans changed since the last refresh.
+
+    Deleting a loan on its own, changing a loan's dates after the refresh that
+    saw it, or moving a book to another genre does not mark anything as
+    changed, so those only show up after a ``full`` rebuild. Returns the number
+    of readers and books refreshed.
+    """
+
+    started = timezone.now()
+    refreshed_at = None if full else snapshot_time()
+    changed = Borrowing.objects.all()
+
+    if refreshed_at is not None:
+        changed = changed.filter(updated_at__gte=refreshed_at - REFRESH_OVERLAP)
+
+    reader_ids = set()
+    days_by_book = defaultdict(set)
+    rows = changed.values_list('reader_id', 'book_id', 'borrowed_date', 'returned_date')
+
+    for reader_id, book_id, borrowed_date, returned_date in rows.iterator(chunk_size=batch_size):
+        reader_ids.add(reader_id)
+        days_by_book[book_id].add(borrowed_date)
+
+        if returned_date is not None:
+            days_by_book[book_id].add(returned_date)
+
+    with transaction.atomic():
+
+        if refreshed_at is None:
+
+            for model in (ReaderCirculation, BookCirculation, LoanCirculation, BookDailyStats, GenreDailyStats):
+                model.objects.all().delete()
+
+        for batch in batches(reader_ids, batch_size):
+            refresh_readers(batch)
+
+        genre_cells = set()
+
+        for batch in batches(days_by_book, batch_size):
+            refresh_books(batch)
+            genre_cells |= refresh_book_stats({book_id: days_by_book[book_id] for book_id in batch})
+
+        if refreshed_at is None:
+            rebuild_genre_stats(batch_size)
+        else:
+
+            for batch in batches(genre_cells, batch_size):
+                refresh_genre_stats(set(batch))
+
+        CirculationSnapshot.objects.update_or_create(pk=1, defaults={'refreshed_at': started})
+
+    return len(reader_ids), len(days_by_book)
+
+
+def overdue_loans(cutoff, live=False):
+    """
+    Open loans borrowed on or before ``cutoff`` with ``reader``, ``book``, ``borrowed_date`` and ``days_overdue``.
+
+    Returns the queryset and the unique ordering to paginate it by.
+    """
+
+    if live:
+        queryset = Borrowing.objects.filter(returned_date__isnull=True, borrowed_date__lte=cutoff)
+        ordering = ('borrowed_date', 'id')
+    else:
+        queryset = LoanCirculation.objects.filter(borrowed_date__lte=cutoff)
+        ordering = ('borrowed_date', 'borrowing_id')
+
+    queryset = queryset.select_related('reader__user', 'book').annotate(days_overdue=days_since('borrowed_date'))
+
+    return queryset, ordering
+
+
+def overdue_readers(cutoff, live=False):
+    """Readers whose oldest open loan was borrowed on or before ``cutoff``, oldest first."""
+
+    if live:
+        readers = Reader.objects.filter(borrowing__returned_date__isnull=True).annotate(
+            open_loans=Count('borrowing'), oldest_borrowed_date=Min('borrowing__borrowed_date')
+        )
+    else:
+        readers = Reader.objects.annotate(
+            open_loans=F('circulation__open_loans'), oldest_borrowed_date=F('circulation__oldest_borrowed_date')
+        )
+
+    return (
+        readers.filter(oldest_borrowed_date__lte=cutoff)
+        .select_related('user')
+        .annotate(max_days_overdue=days_since('oldest_borrowed_date'))
+        .order_by('oldest_borrowed_date', 'pk')
+    )
+
+
+def circulation_stats(date_from, date_to, top):
+    """Most borrowed books, loans per genre and day, and average loan length between two dates, from the rollups."""
+
+    top_books = list(
+        BookDailyStats.objects.filter(day__range=(date_from, date_to), loans__gt=0)
+        .values_list('book_id')
+        .annotate(loans=Sum('loans'))
+        .order_by('-loans', 'book_id')[:top]
+    )
+    # Join the titles for the top rows only, not for every row grouped.
+    books = Book.objects.select_related('author').only('title', 'author__name').in_bulk(
+        [book_id for book_id, _ in top_books]
+    )
+    genres = GenreDailyStats.objects.filter(day__range=(date_from, date_to))
+    returned = genres.aggregate(returns=Sum('returns'), loan_days=Sum('loan_days'))
+
+    return {
+        'most_borrowed': [
+            {'book_id': book_id, 'title': books[book_id].title, 'author': books[book_id].author.name, 'loans': loans}
+            for book_id, loans in top_books if book_id in books
+        ],
+        'loans_per_genre': [
+            {'day': day, 'genre': genre, 'loans': loans}
+            for day, genre, loans in genres.filter(loans__gt=0).order_by('day', 'genre__name').values_list(
+                'day', 'genre__name', 'loans'
+            )
+        ],
+        'average_loan_days': (
+            round(returned['loan_days'] / returned['returns'], 2) if returned['returns'] else None
+        ),
+    }
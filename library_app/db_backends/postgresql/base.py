@@ -0,0 +1,137 @@
+"""
+PostgreSQL backend that can take connections from a ``psycopg_pool`` pool.
+
+Enable it with ``OPTIONS['pool']``: ``True`` or a dict of ``ConnectionPool``
+arguments (``min_size``, ``max_size``, ``max_idle``, ``timeout``...). Without
+that option it behaves exactly like ``django.db.backends.postgresql``. Django
+5.1 ships the same feature; this backend goes away once the project upgrades.
+"""
+
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+from psycopg import IsolationLevel
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_metrics():
+    """
+    Return the pool statistics of this process, keyed by database alias.
+
+    ``checked_out`` and ``waiting`` are current values; ``timeouts`` and the
+    other counters accumulate since the pool was opened.
+    """
+
+    metrics = {}
+
+    for (alias, _), pool in list(_pools.items()):
+        stats = pool.get_stats()
+        metrics[alias] = {
+            'size': stats.get('pool_size', 0),
+            'available': stats.get('pool_available', 0),
+            'checked_out': stats.get('pool_size', 0) - stats.get('pool_available', 0),
+            'waiting': stats.get('requests_waiting', 0),
+            'requests': stats.get('requests_num', 0),
+            'wait_ms': stats.get('requests_wait_ms', 0),
+            'timeouts': stats.get('requests_errors', 0),
+            'connections_opened': stats.get('connections_num', 0),
+            'connections_lost': stats.get('connections_lost', 0),
+        }
+
+    return metrics
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        pool_options = self.settings_dict['OPTIONS'].get('pool')
+
+        if self.alias == NO_DB_ALIAS or not pool_options:
+
+            return None
+
+        # The test runner renames the database in place, so a pool is tied to a name as well as an alias.
+        key = (self.alias, self.settings_dict['NAME'])
+
+        with _pools_lock:
+
+            if key not in _pools:
+                _pools[key] = self.create_pool({} if pool_options is True else pool_options)
+
+                for stale_key in [other for other in _pools if other[0] == self.alias and other != key]:
+                    _pools.pop(stale_key).close()
+
+            return _pools[key]
+
+    def close_pool(self):
+
+        with _pools_lock:
+            pool = _pools.pop((self.alias, self.settings_dict['NAME']), None)
+
+        if pool is not None:
+            pool.close()
+
+    def create_pool(self, pool_options):
+
+        if ConnectionPool is None:
+
+            raise ImproperlyConfigured('OPTIONS["pool"] requires the psycopg_pool package.')
+
+        if self.settings_dict['CONN_MAX_AGE']:
+
+            raise ImproperlyConfigured('Connection pooling does not support persistent connections; '
+                                       'set CONN_MAX_AGE to 0.')
+
+        connect_kwargs = self.get_connection_params()
+        # Django switches autocommit off for transactions itself after checkout.
+        connect_kwargs['autocommit'] = True
+        check = ConnectionPool.check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None
+
+        return ConnectionPool(kwargs=connect_kwargs, open=True, check=check, name=self.alias, **pool_options)
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+
+        if pool is None:
+
+            return super().get_new_connection(conn_params)
+
+        connection = pool.getconn()
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+
+        if isolation_level is None:
+            self.isolation_level = IsolationLevel.READ_COMMITTED
+        else:
+            self.isolation_level = IsolationLevel(isolation_level)
+            connection.isolation_level = self.isolation_level
+
+        return connection
+
+    def _close(self):
+
+        if self.connection is None or self.pool is None:
+
+            return super()._close()
+
+        with self.wrap_database_errors:
+            # The pool rolls back an unfinished transaction before reusing the connection.
+            self.connection._pool.putconn(self.connection)
+            # The connection belongs to the pool again, even when closed inside an atomic block.
+            self.connection = None
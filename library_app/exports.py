@@ -0,0 +1,92 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Book, Borrowing
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+BOOK_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'author': 'author__name',
+    'genre': 'genre__name',
+    'total_copies': 'total_copies',
+    'available_copies': 'available_copies',
+}
+BORROWING_FIELDS = {
+    'id': 'id',
+    'book_id': 'book_id',
+    'book_title': 'book__title',
+    'copy_id': 'copy_id',
+    'reader_id': 'reader_id',
+    'reader_username': 'reader__user__username',
+    'reader_first_name': 'reader__first_name',
+    'reader_last_name': 'reader__last_name',
+    'borrowed_date': 'borrowed_date',
+    'returned_date': 'returned_date',
+}
+
+
+class Echo:
+
+    def write(self, value):
+
+        return value
+
+
+def book_rows():
+
+    return list(BOOK_FIELDS), Book.objects.order_by('id').values_list(*BOOK_FIELDS.values())
+
+
+def borrowing_rows(date_from=None, date_to=None):
+    # values_list() joins book and reader in SQL without building model instances.
+    queryset = Borrowing.objects.order_by('id')
+
+    if date_from is not None:
+        queryset = queryset.filter(borrowed_date__gte=date_from)
+
+    if date_to is not None:
+        queryset = queryset.filter(borrowed_date__lte=date_to)
+
+    return list(BORROWING_FIELDS), queryset.values_list(*BORROWING_FIELDS.values())
+
+
+def _chunks(lines, chunk_size):
+    chunk = []
+
+    for line in lines:
+        chunk.append(line)
+
+        if len(chunk) >= chunk_size:
+
+            yield ''.join(chunk)
+
+            chunk = []
+
+    if chunk:
+
+        yield ''.join(chunk)
+
+
+def stream_csv(header, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    writer = csv.writer(Echo())
+
+    yield writer.writerow(header)
+
+    yield from _chunks((writer.writerow(row) for row in queryset.iterator(chunk_size=chunk_size)), chunk_size)
+
+
+def stream_ndjson(header, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    lines = (encoder.encode(dict(zip(header, row))) + '\n' for row in queryset.iterator(chunk_size=chunk_size))
+
+    yield from _chunks(lines, chunk_size)
+
+
+STREAMS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
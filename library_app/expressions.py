@@ -0,0 +1,30 @@
+from django.db.models import DateField, Func, IntegerField, Value
+from django.utils import timezone
+
+
+class DaysBetween(Func):
+    """
+    Whole days from ``start`` to ``end`` for two date expressions, ``end - start``.
+    """
+
+    arity = 2
+    output_field = IntegerField()
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # Subtracting two dates gives an integer number of days on PostgreSQL.
+
+        return super().as_sql(compiler, connection, template='(%(expressions)s)', arg_joiner=' - ',
+                              **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+
+        return super().as_sql(compiler, connection, template='CAST(JULIANDAY(%(expressions)s) AS INTEGER)',
+                              arg_joiner=') - JULIANDAY(', **extra_context)
+
+
+def days_since(expression):
+
+    return DaysBetween(Value(timezone.localdate(), output_field=DateField()), expression)
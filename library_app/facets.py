@@ -0,0 +1,147 @@
+from collections import Counter
+
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q
+
+from rest_framework.exceptions import ValidationError
+
+
+# Facet -> columns to group by. The first column is the facet value, the second its label.
+FACETS = {
+    'genre': ('genre_id', 'genre__name'),
+    'author': ('author_id', 'author__name'),
+    'available': ('is_available',),
+}
+BOOLEANS = {'true': True, '1': True, 'false': False, '0': False}
+# Ids are bigint primary keys; larger values overflow the database driver.
+MAX_ID = 2 ** 63 - 1
+
+
+def parse_ids(params, param):
+
+    try:
+        ids = sorted({int(value) for value in params[param].split(',')})
+    except ValueError:
+        ids = None
+
+    if not ids or not 1 <= ids[0] <= ids[-1] <= MAX_ID:
+
+        raise ValidationError({param: 'Expected comma-separated ids.'})
+
+    return ids
+
+
+def parse_book_filters(params):
+    """Read ``genre`` and ``author`` id lists and the ``available`` flag from the query string."""
+
+    filters = {}
+
+    for param in ('genre', 'author'):
+
+        if params.get(param):
+            filters[param] = parse_ids(params, param)
+
+    if params.get('available'):
+
+        try:
+            filters['available'] = BOOLEANS[params['available'].lower()]
+        except KeyError:
+
+            raise ValidationError({'available': 'Expected true or false.'})
+
+    return filters
+
+
+def parse_facets(params):
+    facets = [facet for facet in params.get('facets', '').split(',') if facet]
+    unknown = [facet for facet in facets if facet not in FACETS]
+
+    if unknown:
+
+        raise ValidationError({'facets': f'Unknown facets: {", ".join(unknown)}. Choose from {", ".join(FACETS)}.'})
+
+    return sorted(set(facets))
+
+
+def book_filter(facet, value):
+
+    if facet == 'available':
+
+        return Q(available_copies__gt=0) if value else Q(available_copies=0)
+
+    return Q(**{f'{FACETS[facet][0]}__in': value})
+
+
+def filter_books(queryset, filters, exclude=()):
+
+    for facet, value in filters.items():
+
+        if facet not in exclude:
+            queryset = queryset.filter(book_filter(facet, value))
+
+    return queryset
+
+
+def facet_queryset(queryset, filters, facets):
+    """
+    Count books per combination of the ``facets`` values in one ``GROUP BY``.
+
+    Filters on the faceted fields are left to ``count_facets()``, so each facet
+    still counts the values that are not selected.
+    """
+
+    columns = [column for facet in facets for column in FACETS[facet]]
+    queryset = filter_books(queryset, filters, exclude=facets)
+
+    if 'available' in facets:
+        queryset = queryset.annotate(is_available=ExpressionWrapper(Q(available_copies__gt=0), BooleanField()))
+
+    return queryset.values_list(*columns).annotate(count=Count('id')).order_by()
+
+
+def matches(facet, value, filters):
+
+    if facet not in filters:
+
+        return True
+
+    if facet == 'available':
+
+        return value == filters[facet]
+
+    return value in filters[facet]
+
+
+def count_facets(rows, filters, facets):
+    """Fold the rows of ``facet_queryset()`` into per-facet counts, each filtered by the other facets."""
+
+    counts = {facet: Counter() for facet in facets}
+    labels = {}
+
+    for *values, count in rows:
+        values = iter(values)
+        row = {}
+
+        for facet in facets:
+            row[facet] = next(values)
+
+            if len(FACETS[facet]) > 1:
+                labels[facet, row[facet]] = next(values)
+
+        for facet in facets:
+
+            if all(matches(other, row[other], filters) for other in facets if other != facet):
+                counts[facet][row[facet]] += count
+
+    result = {}
+
+    for facet, counter in counts.items():
+
+        if facet == 'available':
+            result[facet] = [{'value': value, 'count': count} for value, count in sorted(counter.items(), reverse=True)]
+        else:
+            result[facet] = sorted(
+                ({'id': value, 'name': labels[facet, value], 'count': count} for value, count in counter.items()),
+                key=lambda item: (-item['count'], item['name']),
+            )
+
+    return result
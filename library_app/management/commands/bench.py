@@ -0,0 +1,250 @@
+import json
+import statistics
+import time
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from library_app.authentication import LibraryTokenObtainPairSerializer
+from library_app.models import Book, Borrowing, Reader, User
+from library_app.urls import urlpatterns
+
+
+PREFIX = 'bench'
+
+# Route name -> (method, client, query string or JSON body). Borrow routes are
+# followed by their return route so each iteration leaves the data unchanged.
+ROUTES = {
+    'home': ('get', 'reader_session', {}),
+    'book_list': ('get', 'reader_session', {}),
+    'register': ('get', 'anonymous', {}),
+    'login': ('get', 'anonymous', {}),
+    'logout': ('get', 'anonymous', {}),
+    'borrow_book': ('get', 'reader_session', {}),
+    'return_book': ('get', 'reader_session', {}),
+    'my_books': ('get', 'reader_session', {}),
+    'librarian_login': ('get', 'anonymous', {}),
+    'librarian_dashboard': ('get', 'librarian_session', {}),
+    'api_book_list': ('get', 'reader_token', {}),
+    'api_book_search': ('get', 'reader_token', {'q': 'night'}),
+    'api_borrow_book': ('post', 'reader_token', {}),
+    'api_return_book': ('post', 'reader_token', {}),
+    'api_borrow_batch': ('post', 'reader_token', None),
+    'api_return_batch': ('post', 'reader_token', None),
+    'api_my_books': ('get', 'reader_token', {}),
+    'home_async': ('get', 'reader_session', {}),
+    'api_book_list_async': ('get', 'reader_token', {}),
+    'api_my_books_async': ('get', 'reader_token', {}),
+    'api_export_books': ('get', 'reader_token', {'format': 'ndjson'}),
+    'api_export_borrowings': ('get', 'librarian_token', {'format': 'ndjson'}),
+    'api_stats': ('get', 'librarian_token', {}),
+    'metrics': ('get', 'librarian_session', {}),
+}
+PAIRS = {
+    'borrow_book': 'return_book',
+    'api_borrow_book': 'api_return_book',
+    'api_borrow_batch': 'api_return_batch',
+}
+BATCH_SIZE = 5
+
+
+class QueryCounter:
+    """``execute_wrapper`` that counts queries and the rows they return, where the driver reports it."""
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = None
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        self.queries += 1
+        # psycopg reports the row count of a SELECT; sqlite3 reports -1.
+        rowcount = context['cursor'].rowcount
+
+        if sql.lstrip()[:6].upper() == 'SELECT' and rowcount >= 0:
+            self.rows = (self.rows or 0) + rowcount
+
+        return result
+
+
+class Command(BaseCommand):
+    help = ('Request every route in library_app/urls.py in-process as a reader, a librarian or anonymously, '
+            'and report latency, queries and rows per request. Run seed_library first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requests per route.')
+        parser.add_argument('--routes', nargs='+', choices=sorted(ROUTES), help='Only these routes.')
+        parser.add_argument('--cache', action='store_true',
+                            help='Keep the catalog cache between requests instead of clearing it.')
+        parser.add_argument('--host', default='localhost', help='Host header; must be in ALLOWED_HOSTS.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare against.')
+
+    def handle(self, *args, **options):
+
+        if options['requests'] <= 0:
+
+            raise CommandError('--requests must be positive.')
+
+        names = [pattern.name for pattern in urlpatterns]
+
+        for name in names:
+
+            if name not in ROUTES:
+                self.stderr.write(f'Route {name} is not benchmarked; add it to ROUTES in bench.py.')
+
+        self.options = options
+        self.clients = self.make_clients()
+        self.books = list(
+            Book.objects.filter(available_copies__gt=0).order_by('id').values_list('id', flat=True)[:BATCH_SIZE + 1]
+        )
+
+        if len(self.books) <= BATCH_SIZE:
+
+            raise CommandError('Not enough available books; run seed_library first.')
+
+        selected = [name for name in names if name in ROUTES and name not in PAIRS.values()]
+
+        if options['routes']:
+            wanted = set(options['routes'])
+            selected = [name for name in selected if name in wanted or PAIRS.get(name) in wanted]
+
+        results = {}
+
+        for name in selected:
+            results.update(self.run(name))
+
+        self.report(results)
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({
+                'created': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'books': Book.objects.count(),
+                'loans': Borrowing.objects.count(),
+                'requests': options['requests'],
+                'routes': results,
+            }, indent=2))
+
+        if options['compare']:
+            self.compare(results, json.loads(Path(options['compare']).read_text())['routes'])
+
+    def make_clients(self):
+        reader_user, _ = User.objects.get_or_create(username=f'{PREFIX}-reader', defaults={'is_reader': True})
+        Reader.objects.get_or_create(user=reader_user, defaults={'first_name': 'Bench', 'last_name': 'Reader',
+                                                                  'address': PREFIX})
+        librarian_user, _ = User.objects.update_or_create(username=f'{PREFIX}-librarian',
+                                                          defaults={'is_librarian': True, 'is_staff': True})
+        host = self.options['host']
+        clients = {'anonymous': Client(SERVER_NAME=host)}
+
+        for role, user in (('reader', reader_user), ('librarian', librarian_user)):
+            session = Client(SERVER_NAME=host)
+            session.force_login(user)
+            clients[f'{role}_session'] = session
+            token = LibraryTokenObtainPairSerializer.get_token(user).access_token
+            clients[f'{role}_token'] = Client(SERVER_NAME=host, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        return clients
+
+    def request(self, name, counter):
+        method, client, params = ROUTES[name]
+        client = self.clients[client]
+        kwargs = {'book_id': self.books[0]} if 'book_id' in self.route_args(name) else {}
+        url = reverse(name, kwargs=kwargs)
+
+        if params is None:
+            params = json.dumps({'book_ids': self.books[1:BATCH_SIZE + 1]})
+
+        if name == 'api_export_borrowings':
+            params = {**params, 'date_from': (timezone.localdate() - timedelta(days=30)).isoformat()}
+
+        if not self.options['cache']:
+            cache.clear()
+
+        started = time.perf_counter()
+
+        with connection.execute_wrapper(counter):
+
+            if method == 'post':
+                response = client.post(url, params, content_type='application/json')
+            else:
+                response = client.get(url, params)
+
+            size = len(b''.join(response.streaming_content) if response.streaming else response.content)
+
+        return time.perf_counter() - started, response.status_code, size
+
+    def route_args(self, name):
+
+        return next(pattern.pattern.converters for pattern in urlpatterns if pattern.name == name)
+
+    def run(self, name):
+        names = [name, PAIRS[name]] if name in PAIRS else [name]
+        samples = {route: {'latencies': [], 'statuses': Counter(), 'queries': 0, 'rows': None, 'bytes': 0}
+                   for route in names}
+
+        for _ in range(self.options['requests']):
+
+            for route in names:
+                counter = QueryCounter()
+                latency, status, size = self.request(route, counter)
+                sample = samples[route]
+                sample['latencies'].append(latency)
+                sample['statuses'][status] += 1
+                sample['queries'] += counter.queries
+                sample['rows'] = None if counter.rows is None else (sample['rows'] or 0) + counter.rows
+                sample['bytes'] += size
+
+        results = {}
+
+        for route, sample in samples.items():
+            latencies = sorted(sample['latencies'])
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            count = len(latencies)
+            results[route] = {
+                'method': ROUTES[route][0].upper(),
+                'status': dict(sample['statuses']),
+                'p50_ms': round(quantiles[49] * 1000, 2),
+                'p95_ms': round(quantiles[94] * 1000, 2),
+                'p99_ms': round(quantiles[98] * 1000, 2),
+                'queries': round(sample['queries'] / count, 1),
+                'rows': None if sample['rows'] is None else round(sample['rows'] / count, 1),
+                'bytes': round(sample['bytes'] / count),
+            }
+
+        return results
+
+    def report(self, results):
+        self.stdout.write(f'{"route":<24}{"status":<12}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+                          f'{"queries":>9}{"rows":>9}{"bytes":>10}')
+
+        for route, result in results.items():
+            statuses = ','.join(str(status) for status in result['status'])
+            rows = '-' if result['rows'] is None else f'{result["rows"]:.1f}'
+            self.stdout.write(
+                f'{route:<24}{statuses:<12}{result["p50_ms"]:>9.2f}{result["p95_ms"]:>9.2f}{result["p99_ms"]:>9.2f}'
+                f'{result["queries"]:>9.1f}{rows:>9}{result["bytes"]:>10}'
+            )
+
+    def compare(self, results, baseline):
+        self.stdout.write('\nChange against the baseline:')
+
+        for route, result in results.items():
+
+            if route not in baseline:
+                continue
+
+            before = baseline[route]
+            change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            line = (f'{route:<24}p50 {before["p50_ms"]:.2f} -> {result["p50_ms"]:.2f} ms ({change:+.0f}%), '
+                    f'queries {before["queries"]} -> {result["queries"]}')
+            style = self.style.ERROR if change > 10 or result['queries'] > before['queries'] else self.style.SUCCESS
+            self.stdout.write(style(line))
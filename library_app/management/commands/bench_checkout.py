@@ -0,0 +1,220 @@
+import random
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction, OperationalError
+from django.db.models import Count, F, Q
+
+from library_app.models import Author, User, Reader, Book, Borrowing, Copy, Genre
+from library_app.services import CirculationError, checkout_book, checkin_book
+
+
+PREFIX = 'bench-checkout'
+# A return that still fails on lock errors after this many tries is left open and reported.
+CHECKIN_ATTEMPTS = 20
+RETRY_DELAY = 0.01
+# Seconds between two looks at the open loans while the workers run.
+SAMPLE_INTERVAL = 0.01
+
+
+class Command(BaseCommand):
+    help = 'Run concurrent checkouts against a few books and verify that no copy is lent twice.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--books', type=int, default=4, help='Fewer books means more contention.')
+        parser.add_argument('--copies', type=int, default=1, help='Copies of each book.')
+        parser.add_argument('--operations', type=int, default=200, help='Checkout attempts per thread.')
+        parser.add_argument('--hold', type=float, default=0.005,
+                            help='Longest time in seconds a loan is held before it is returned.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+
+        if options['copies'] <= 0:
+
+            raise CommandError('--copies must be positive.')
+
+        if options['hold'] < 0:
+
+            raise CommandError('--hold must not be negative.')
+
+        if connection.vendor == 'sqlite' and options['threads'] > 1:
+            self.stderr.write('SQLite serializes writers; expect lock errors instead of real contention.')
+
+        self.cleanup()
+        author, _ = Author.objects.get_or_create(name=PREFIX)
+        genre, _ = Genre.objects.get_or_create(name=PREFIX)
+        copies = options['copies']
+        books = Book.objects.bulk_create(
+            Book(title=f'{PREFIX} {i}', author=author, genre=genre, total_copies=copies, available_copies=copies)
+            for i in range(options['books'])
+        )
+        Copy.objects.bulk_create(Copy(book=book) for book in books for _ in range(copies))
+        book_ids = [book.id for book in books]
+        readers = []
+
+        for i in range(options['threads']):
+            user = User.objects.create(username=f'{PREFIX}-{i}', is_reader=True)
+            readers.append(Reader.objects.create(user=user, first_name='Bench', last_name=str(i), address=PREFIX))
+
+        outcomes = Counter()
+        lock = threading.Lock()
+        # How many copies of each book the service says are lent out. The count drops just before
+        # checkin, so a checkout that finds every copy still lent means one was lent twice.
+        lent = Counter()
+        start = threading.Barrier(options['threads'] + 2)
+        done = threading.Event()
+        double_loans = []
+
+        def worker(index):
+            rng = random.Random(options['seed'] + index)
+            reader = readers[index]
+            local = Counter()
+            start.wait()
+
+            try:
+
+                for _ in range(options['operations']):
+                    book_id = rng.choice(book_ids)
+
+                    try:
+                        checkout_book(reader, book_id)
+                        local['borrowed'] += 1
+
+                        with lock:
+
+                            if lent[book_id] >= copies:
+                                local['double_loans'] += 1
+
+                            lent[book_id] += 1
+
+                        # Keep the loan open for a while, so other threads compete for the remaining copies.
+                        time.sleep(rng.uniform(0, options['hold']))
+
+                        with lock:
+                            lent[book_id] -= 1
+
+                        self.checkin(reader, book_id, local)
+                    except CirculationError:
+                        local['conflicts'] += 1
+                    except OperationalError:
+                        local['lock_errors'] += 1
+            finally:
+                connection.close()
+
+                with lock:
+                    outcomes.update(local)
+
+        def sampler():
+            local = Counter()
+            start.wait()
+
+            try:
+
+                while not done.is_set():
+                    local['samples'] += 1
+
+                    try:
+                        double_loans.extend(self.double_loans(book_ids, copies))
+                    except OperationalError:
+                        local['sample_lock_errors'] += 1
+
+                    done.wait(SAMPLE_INTERVAL)
+            finally:
+                connection.close()
+
+                with lock:
+                    outcomes.update(local)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        sampler_thread = threading.Thread(target=sampler)
+
+        for thread in threads + [sampler_thread]:
+            thread.start()
+
+        start.wait()
+        started = time.perf_counter()
+
+        for thread in threads:
+            thread.join()
+
+        elapsed = time.perf_counter() - started
+        done.set()
+        sampler_thread.join()
+
+        try:
+            self.verify(book_ids, outcomes, double_loans)
+        finally:
+            self.cleanup()
+
+        attempts = options['threads'] * options['operations']
+        self.stdout.write(
+            f"{attempts} checkout attempts in {elapsed:.2f}s "
+            f"({attempts / elapsed:.0f} attempts/s, {outcomes['borrowed'] / elapsed:.0f} loans/s)"
+        )
+        self.stdout.write(
+            f"borrowed={outcomes['borrowed']} returned={outcomes['returned']} "
+            f"conflicts={outcomes['conflicts']} lock_errors={outcomes['lock_errors']} "
+            f"unreturned={outcomes['unreturned']} samples={outcomes['samples']}"
+        )
+        self.stdout.write(self.style.SUCCESS('No double loans.'))
+
+    def checkin(self, reader, book_id, counter):
+
+        for _ in range(CHECKIN_ATTEMPTS):
+
+            try:
+                checkin_book(reader, book_id)
+                counter['returned'] += 1
+
+                return
+            except OperationalError:
+                counter['lock_errors'] += 1
+                time.sleep(RETRY_DELAY)
+
+        counter['unreturned'] += 1
+
+    def double_loans(self, book_ids, copies):
+        """Copies with more than one open loan, and books with more open loans than copies, right now."""
+
+        open_loans = Borrowing.objects.filter(book_id__in=book_ids, returned_date__isnull=True).order_by()
+        per_copy = open_loans.values('copy_id').annotate(open_loans=Count('id')).filter(open_loans__gt=1)
+        per_book = open_loans.values('book_id').annotate(open_loans=Count('id')).filter(open_loans__gt=copies)
+
+        return list(per_copy) + list(per_book)
+
+    def verify(self, book_ids, outcomes, double_loans):
+
+        if outcomes['double_loans']:
+
+            raise CommandError(f"{outcomes['double_loans']} checkouts succeeded while every copy was lent out")
+
+        if double_loans:
+
+            raise CommandError(f'Double loans seen while the workers ran: {double_loans[:10]}')
+
+        miscounted = (
+            Book.objects.filter(id__in=book_ids)
+            .annotate(open_loans=Count('borrowing', filter=Q(borrowing__returned_date__isnull=True)))
+            .exclude(available_copies=F('total_copies') - F('open_loans'))
+        )
+
+        if miscounted.exists():
+            rows = list(miscounted.values('id', 'total_copies', 'available_copies', 'open_loans'))
+
+            raise CommandError(f'Available copies out of step with open loans: {rows}')
+
+        loans = Borrowing.objects.filter(book_id__in=book_ids).count()
+
+        if loans != outcomes['borrowed']:
+
+            raise CommandError(f'{loans} loans recorded but {outcomes["borrowed"]} checkouts reported')
+
+    def cleanup(self):
+
+        with transaction.atomic():
+            Book.objects.filter(author__name=PREFIX).delete()
+            User.objects.filter(username__startswith=f'{PREFIX}-').delete()
@@ -0,0 +1,85 @@
+import copy
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from library_app.db_backends.postgresql.base import pool_metrics
+
+
+MODES = ('direct', 'persistent', 'pooled')
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request database overhead with new, persistent and pooled PostgreSQL connections.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--threads', type=int, default=4, help='Also the pool size in pooled mode.')
+
+    def handle(self, *args, **options):
+
+        if connections['default'].vendor != 'postgresql':
+
+            raise CommandError('bench_db_connections needs the PostgreSQL database.')
+
+        for mode in options['modes']:
+            self.run(mode, options)
+
+    def settings_dict(self, mode, threads):
+        settings_dict = copy.deepcopy(connections['default'].settings_dict)
+        settings_dict['OPTIONS'].pop('pool', None)
+        settings_dict['CONN_MAX_AGE'] = None if mode == 'persistent' else 0
+
+        if mode == 'pooled':
+            settings_dict['OPTIONS']['pool'] = {'min_size': threads, 'max_size': threads}
+
+        return settings_dict
+
+    def run(self, mode, options):
+        alias = f'bench-{mode}'
+        connections.settings[alias] = self.settings_dict(mode, options['threads'])
+        opened = []
+
+        def request(_):
+            # Connections are per thread, like in a threaded WSGI server.
+            connection = connections[alias]
+
+            if connection not in opened:
+                opened.append(connection)
+
+            started = time.perf_counter()
+
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+
+            # What Django does when a request finishes.
+            connection.close_if_unusable_or_obsolete()
+
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            latencies = sorted(executor.map(request, range(options['requests'])))
+
+        elapsed = time.perf_counter() - started
+        quantiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{mode}: {len(latencies) / elapsed:.0f} req/s with {options['threads']} threads, "
+            f"p50 {quantiles[49] * 1000:.2f} ms, p95 {quantiles[94] * 1000:.2f} ms, "
+            f"mean {statistics.mean(latencies) * 1000:.2f} ms"
+        )
+
+        if mode == 'pooled':
+            self.stdout.write(f"pool: {pool_metrics()[alias]}")
+
+        for connection in opened:
+            connection.inc_thread_sharing()
+            connection.close()
+            connection.close_pool()
+
+        del connections.settings[alias]
@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.urls import reverse
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from library_app import renderers, views
+from library_app.models import Author, User, Reader, Book, Borrowing, Copy, Genre
+
+
+class Command(BaseCommand):
+    help = 'Compare the stdlib JSONRenderer with FastJSONRenderer on responses of the API views (rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=500, help='Catalog size and number of open loans.')
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+
+        if renderers.orjson is None:
+            self.stderr.write('orjson is not installed; FastJSONRenderer falls back to the stdlib encoder.')
+
+        with transaction.atomic():
+            payloads = self.collect_payloads(options['books'])
+            transaction.set_rollback(True)
+
+        stdlib, fast = JSONRenderer(), renderers.FastJSONRenderer()
+        self.stdout.write(f"{'view':16} {'bytes':>9} {'stdlib µs':>11} {'fast µs':>11} {'speedup':>8}")
+
+        for name, data in payloads.items():
+            stdlib_time = self.measure(stdlib, data, options['repeat'])
+            fast_time = self.measure(fast, data, options['repeat'])
+            size = len(fast.render(data))
+            self.stdout.write(f'{name:16} {size:9} {stdlib_time * 1e6:11.1f} {fast_time * 1e6:11.1f} '
+                              f'{stdlib_time / fast_time:7.1f}x')
+
+    def collect_payloads(self, count):
+        factory = APIRequestFactory(SERVER_NAME='localhost')
+        user = User.objects.create(username='bench-renderers', is_reader=True)
+        reader = Reader.objects.create(user=user, first_name='Bench', last_name='Renderers', address='-')
+        author, _ = Author.objects.get_or_create(name='Bench Author')
+        genre, _ = Genre.objects.get_or_create(name='Bench Genre')
+        books = Book.objects.bulk_create(
+            Book(title=f'Bench {i}', author=author, genre=genre, total_copies=1, available_copies=1)
+            for i in range(count + 1)
+        )
+        copies = Copy.objects.bulk_create(Copy(book=book) for book in books)
+        Borrowing.objects.bulk_create(Borrowing(reader=reader, book_id=copy.book_id, copy=copy) for copy in copies[1:])
+        Book.objects.filter(id__in=[book.id for book in books[1:]]).update(available_copies=0)
+
+        def call(view, method, url, **kwargs):
+            request = getattr(factory, method)(url)
+            force_authenticate(request, user=user)
+
+            return view.as_view()(request, **kwargs).data
+
+        book_id = books[0].id
+
+        return {
+            'api_book_list': call(views.BookListView, 'get', reverse('api_book_list') + f'?page_size={count}'),
+            'api_borrow_book': call(views.BorrowBookView, 'post', reverse('api_borrow_book', args=[book_id]),
+                                    book_id=book_id),
+            'api_return_book': call(views.ReturnBookView, 'post', reverse('api_return_book', args=[book_id]),
+                                    book_id=book_id),
+            'api_my_books': call(views.MyBooksView, 'get', reverse('api_my_books')),
+        }
+
+    def measure(self, renderer, data, repeat):
+        started = time.perf_counter()
+
+        for _ in range(repeat):
+            renderer.render(data)
+
+        return (time.perf_counter() - started) / repeat
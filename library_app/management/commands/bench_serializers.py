@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from library_app.models import Author, User, Reader, Book, Borrowing, Genre
+from library_app.serializers import BorrowingSerializer, BorrowingValuesSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare BorrowingSerializer with BorrowingValuesSerializer on synthetic loans (rolled back afterwards).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+
+        with transaction.atomic():
+            user = User.objects.create(username='bench-serializers', is_reader=True)
+            reader = Reader.objects.create(user=user, first_name='Bench', last_name='Serializers', address='-')
+            author, _ = Author.objects.get_or_create(name='Bench')
+            genre, _ = Genre.objects.get_or_create(name='Bench')
+            books = Book.objects.bulk_create(
+                Book(title=f'Bench {i}', author=author, genre=genre) for i in range(options['rows'])
+            )
+            Borrowing.objects.bulk_create(Borrowing(reader=reader, book=book) for book in books)
+            borrowings = Borrowing.objects.filter(reader=reader).order_by('id')
+
+            model = self.measure(lambda: BorrowingSerializer(borrowings.all(), many=True).data, options['repeat'])
+            joined = self.measure(
+                lambda: BorrowingSerializer(borrowings.select_related('book'), many=True).data, options['repeat']
+            )
+            values = self.measure(lambda: BorrowingValuesSerializer(borrowings.all()).data, options['repeat'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{options['rows']} rows, best of {options['repeat']}:")
+        self.stdout.write(f"  {'BorrowingSerializer':40} {model * 1000:9.1f} ms")
+        self.stdout.write(f"  {'BorrowingSerializer + select_related':40} {joined * 1000:9.1f} ms")
+        self.stdout.write(f"  {'BorrowingValuesSerializer':40} {values * 1000:9.1f} ms ({model / values:.1f}x faster)")
+
+    def measure(self, build, repeat):
+        timings = []
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            build()
+            timings.append(time.perf_counter() - started)
+
+        return min(timings)
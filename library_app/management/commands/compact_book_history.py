@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from library_app.models import HistoricalBook
+
+
+class Command(BaseCommand):
+    help = 'Delete book history snapshots that repeat the previous one and prune snapshots by age.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Prune snapshots older than this many days. '
+                                                     'The latest snapshot of every book is always kept.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+
+        if options['batch_size'] <= 0:
+
+            raise CommandError('--batch-size must be positive.')
+
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        duplicates = self.delete_duplicates()
+        self.stdout.write(f'{duplicates} redundant snapshots {"found" if self.dry_run else "deleted"}')
+
+        if options['days'] is not None:
+            pruned = self.prune(timezone.now() - timedelta(days=options['days']))
+            self.stdout.write(f'{pruned} old snapshots {"found" if self.dry_run else "deleted"}')
+
+    def delete_ids(self, history_ids):
+
+        if not self.dry_run:
+            HistoricalBook.objects.filter(history_id__in=history_ids).delete()
+
+        return len(history_ids)
+
+    def delete_duplicates(self):
+        fields = [field.attname for field in HistoricalBook.tracked_fields]
+        rows = (
+            HistoricalBook.objects.order_by('id', 'history_date', 'history_id')
+            .values_list('history_id', 'history_type', *fields)
+            .iterator(chunk_size=self.batch_size)
+        )
+        previous = None
+        pending = []
+        deleted = 0
+
+        for history_id, history_type, *values in rows:
+
+            if history_type == '~' and values == previous:
+                pending.append(history_id)
+
+            previous = values
+
+            if len(pending) >= self.batch_size:
+                deleted += self.delete_ids(pending)
+                pending = []
+
+        return deleted + self.delete_ids(pending)
+
+    def prune(self, cutoff):
+        newer = HistoricalBook.objects.filter(id=OuterRef('id')).filter(
+            Q(history_date__gt=OuterRef('history_date'))
+            | Q(history_date=OuterRef('history_date'), history_id__gt=OuterRef('history_id'))
+        )
+        old = HistoricalBook.objects.filter(history_date__lt=cutoff).filter(Exists(newer))
+
+        if self.dry_run:
+
+            return old.count()
+
+        deleted = 0
+
+        while history_ids := list(old.values_list('history_id', flat=True)[:self.batch_size]):
+            deleted += self.delete_ids(history_ids)
+
+        return deleted
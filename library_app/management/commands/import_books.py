@@ -0,0 +1,189 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
+
+from library_app.cache import bump_catalog_version
+from library_app.models import Author, Book, Copy, Genre
+
+
+FIELDS = ('title', 'author', 'genre')
+MAX_COPIES = 1000
+
+
+class Command(BaseCommand):
+    help = 'Import books from a CSV or JSON Lines file in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file with title, author, genre and optionally copies '
+                                         '(1 by default); "-" reads stdin.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--on-duplicate', choices=['skip', 'update'], default='skip',
+                            help='What to do with rows whose (title, author) is already in the catalog.')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing.')
+        parser.add_argument('--change-reason', default='Bulk import')
+
+    def handle(self, *args, **options):
+
+        if options['batch_size'] <= 0:
+
+            raise CommandError('--batch-size must be positive.')
+
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        self.options = options
+        self.totals = {'created': 0, 'updated': 0, 'skipped': 0, 'invalid': 0}
+        started = time.perf_counter()
+
+        with self.open(path) as stream:
+            rows = self.read_rows(stream, file_format)
+
+            while batch := list(islice(rows, options['batch_size'])):
+                self.import_batch(batch)
+                processed = sum(self.totals.values())
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{processed} rows processed, {processed / elapsed:.0f} rows/s')
+
+        if not options['dry_run'] and (self.totals['created'] or self.totals['updated']):
+            bump_catalog_version()
+
+        summary = ', '.join(f'{count} {name}' for name, count in self.totals.items())
+        prefix = 'Dry run: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(f'{prefix}{summary} in {time.perf_counter() - started:.1f}s'))
+
+    def open(self, path):
+
+        if path == '-':
+
+            return open(sys.stdin.fileno(), encoding='utf-8', newline='', closefd=False)
+
+        if not Path(path).exists():
+
+            raise CommandError(f'File not found: {path}')
+
+        return open(path, encoding='utf-8', newline='')
+
+    def read_rows(self, stream, file_format):
+
+        if file_format == 'csv':
+            records = enumerate(csv.DictReader(stream), start=2)
+        else:
+            records = ((number, line) for number, line in enumerate(stream, start=1) if line.strip())
+
+        for number, record in records:
+
+            try:
+
+                if file_format == 'jsonl':
+                    record = json.loads(record)
+
+                yield self.clean(record)
+            except ValueError as error:
+                self.totals['invalid'] += 1
+                self.stderr.write(f'Line {number}: {error}')
+
+    def clean(self, record):
+
+        if not isinstance(record, dict):
+
+            raise ValueError('expected an object')
+
+        row = {}
+
+        for field in FIELDS:
+            value = str(record.get(field) or '').strip()
+            model_field = Book._meta.get_field(field)
+
+            if model_field.is_relation:
+                model_field = model_field.related_model._meta.get_field('name')
+
+            max_length = model_field.max_length
+
+            if not value:
+
+                raise ValueError(f'missing {field}')
+
+            if len(value) > max_length:
+
+                raise ValueError(f'{field} is longer than {max_length} characters')
+
+            row[field] = value
+
+        copies = str(record.get('copies') or '').strip() or '1'
+
+        if not copies.isdigit() or not 0 < int(copies) <= MAX_COPIES:
+
+            raise ValueError(f'copies must be a whole number from 1 to {MAX_COPIES}')
+
+        row['copies'] = int(copies)
+
+        return row
+
+    def import_batch(self, batch):
+        # Later rows win when the file repeats a (title, author) pair.
+        rows = {(row['title'], row['author']): row for row in batch}
+        self.totals['skipped'] += len(batch) - len(rows)
+        existing = {}
+
+        for book in Book.objects.filter(
+            title__in={title for title, _ in rows}, author__name__in={author for _, author in rows}
+        ).select_related('author', 'genre').only('id', 'title', 'author__name', 'genre__name'):
+            existing.setdefault((book.title, book.author.name), []).append(book)
+
+        new_rows = [row for key, row in rows.items() if key not in existing]
+        changed = []
+
+        for key, row in rows.items():
+
+            if key not in existing:
+                continue
+
+            if self.options['on_duplicate'] == 'skip':
+                self.totals['skipped'] += 1
+                continue
+
+            for book in existing[key]:
+
+                if book.genre.name != row['genre']:
+                    changed.append((book, row['genre']))
+
+        self.totals['created'] += len(new_rows)
+        self.totals['updated'] += len(changed)
+
+        if self.options['dry_run']:
+
+            return
+
+        history = {'default_change_reason': self.options['change_reason']}
+
+        with transaction.atomic():
+            authors = Author.objects.ids_for(row['author'] for row in new_rows)
+            genres = Genre.objects.ids_for([row['genre'] for row in new_rows] + [genre for _, genre in changed])
+
+            if new_rows:
+                new_books = [
+                    Book(title=row['title'], author_id=authors[row['author']], genre_id=genres[row['genre']],
+                         total_copies=row['copies'], available_copies=row['copies'])
+                    for row in new_rows
+                ]
+                new_books = bulk_create_with_history(new_books, Book, batch_size=self.options['batch_size'], **history)
+                Copy.objects.bulk_create(
+                    (Copy(book=book) for book in new_books for _ in range(book.total_copies)),
+                    batch_size=self.options['batch_size'],
+                )
+
+            if changed:
+
+                for book, genre in changed:
+                    book.genre_id = genres[genre]
+
+                bulk_update_with_history([book for book, _ in changed], Book, ['genre'],
+                                         batch_size=self.options['batch_size'], **history)
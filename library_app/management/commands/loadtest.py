@@ -0,0 +1,62 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Fire concurrent GET requests at a running server, e.g. the same URL under a WSGI server and '
+            'under an ASGI server started with SIMULATED_DB_LATENCY_MS set.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per URL.')
+        parser.add_argument('--token', help='JWT access token sent as "Authorization: Bearer".')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        headers = {'Authorization': f"Bearer {options['token']}"} if options['token'] else {}
+
+        for url in options['urls']:
+            self.run(url, headers, options)
+
+    def run(self, url, headers, options):
+
+        def fetch(_):
+            started = time.perf_counter()
+
+            try:
+
+                with urlopen(Request(url, headers=headers), timeout=options['timeout']) as response:
+                    response.read()
+                    code = response.status
+            except HTTPError as error:
+                code = error.code
+            except (URLError, TimeoutError):
+                code = None
+
+            return code, time.perf_counter() - started
+
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(fetch, range(options['requests'])))
+
+        elapsed = time.perf_counter() - started
+        latencies = sorted(latency for code, latency in results if code is not None and code < 400)
+        errors = len(results) - len(latencies)
+
+        if not latencies:
+
+            raise CommandError(f'{url}: all {errors} requests failed')
+
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        self.stdout.write(
+            f"{url}: {len(results) / elapsed:.1f} req/s with concurrency {options['concurrency']}, "
+            f"p50 {quantiles[49] * 1000:.0f} ms, p95 {quantiles[94] * 1000:.0f} ms, "
+            f"p99 {quantiles[98] * 1000:.0f} ms, {errors} errors"
+        )
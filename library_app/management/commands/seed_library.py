@@ -0,0 +1,216 @@
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from library_app.cache import bump_catalog_version
+from library_app.models import Author, Book, Borrowing, Copy, Genre, Librarian, Reader, User
+from library_app.services import refresh_copy_counts
+
+
+GENRES = [
+    'Fiction', 'Mystery', 'Fantasy', 'Science Fiction', 'Romance', 'Thriller', 'History', 'Biography',
+    'Children', 'Poetry', 'Philosophy', 'Science', 'Travel', 'Horror', 'Drama', 'Cooking', 'Art', 'Religion',
+    'Economics', 'Programming',
+]
+FIRST_NAMES = [
+    'Anna', 'Boris', 'Clara', 'Dmitri', 'Elena', 'Fyodor', 'Galina', 'Ivan', 'Katya', 'Leo', 'Maria', 'Nikolai',
+    'Olga', 'Pavel', 'Sofia', 'Timur', 'Vera', 'Yuri', 'Zoya', 'Alexei', 'James', 'Emily', 'George', 'Jane',
+]
+LAST_NAMES = [
+    'Ivanov', 'Petrova', 'Smirnov', 'Volkova', 'Kuznetsov', 'Popova', 'Sokolov', 'Lebedeva', 'Kozlov', 'Novikova',
+    'Morozov', 'Orlova', 'Austen', 'Dickens', 'Bronte', 'Tolkien', 'Christie', 'Orwell', 'Woolf', 'Hardy',
+]
+TITLE_WORDS = [
+    'Silent', 'River', 'Shadow', 'Winter', 'Garden', 'Empire', 'Secret', 'Journey', 'Stars', 'Night', 'Golden',
+    'Forgotten', 'City', 'House', 'War', 'Peace', 'Sea', 'Mountain', 'Light', 'Dark', 'Last', 'First', 'Lost',
+    'Kingdom', 'Letters', 'Dreams', 'Storm', 'Machine', 'Island', 'Road', 'Fire', 'Glass', 'Iron', 'Crown',
+]
+# Loans last up to this many days, with up to a third of that between two loans of a book.
+LOAN_DAYS = 21
+
+
+def zipf_cum_weights(n, exponent):
+    """Cumulative Zipf weights for ``random.choices``: item k is picked about 1 / k**exponent as often as item 1."""
+
+    return list(accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic catalog, readers and loan history with skewed popularity, for benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=10000)
+        parser.add_argument('--readers', type=int, default=1000)
+        parser.add_argument('--loans', type=int, default=50000, help='Loans in total, returned and open.')
+        parser.add_argument('--librarians', type=int, default=2)
+        parser.add_argument('--max-copies', type=int, default=1,
+                            help='Each book gets between 1 and this many copies; its loans use the first.')
+        parser.add_argument('--open-ratio', type=float, default=0.3,
+                            help='Share of borrowed books whose latest loan is still open.')
+        parser.add_argument('--days', type=int, default=730, help='How far back the loan history goes.')
+        parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent for book and author popularity.')
+        parser.add_argument('--reader-skew', type=float, default=0.7, help='Zipf exponent for how much readers borrow.')
+        parser.add_argument('--prefix', default='seed', help='Username prefix of the generated users.')
+        parser.add_argument('--password', default='password', help='Password of every generated user.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+
+        positive = (options['books'], options['readers'], options['max_copies'], options['batch_size'])
+
+        if min(positive) <= 0 or options['loans'] < 0:
+
+            raise CommandError('--books, --readers, --max-copies and --batch-size must be positive.')
+
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+
+            raise CommandError(f"Users named {options['prefix']}-* already exist; pick another --prefix.")
+
+        self.options = options
+        self.random = random.Random(options['seed'])
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            books = self.create_books()
+            readers = self.create_users()
+            loans = self.create_loans(books, readers)
+
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(books)} books, {len(readers)} readers, {options["librarians"]} librarians and {loans} loans '
+            f'created in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def create_books(self):
+        count = self.options['books']
+        authors = [
+            f'{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}' for _ in range(max(count // 10, 1))
+        ]
+        author_weights = zipf_cum_weights(len(authors), self.options['skew'])
+        genre_weights = zipf_cum_weights(len(GENRES), self.options['skew'])
+        author_ids = Author.objects.ids_for(authors)
+        genre_ids = Genre.objects.ids_for(GENRES)
+        books = [
+            Book(
+                title=' '.join(self.random.sample(TITLE_WORDS, self.random.randint(1, 3)))
+                + (f' {self.random.randint(2, 9)}' if self.random.random() < 0.2 else ''),
+                author_id=author_ids[author],
+                genre_id=genre_ids[genre],
+                total_copies=self.random.randint(1, self.options['max_copies']),
+            )
+            for author, genre in zip(
+                self.random.choices(authors, cum_weights=author_weights, k=count),
+                self.random.choices(GENRES, cum_weights=genre_weights, k=count),
+            )
+        ]
+        books = Book.objects.bulk_create(books, batch_size=self.options['batch_size'])
+        copies = Copy.objects.bulk_create(
+            (Copy(book=book) for book in books for _ in range(book.total_copies)), batch_size=self.options['batch_size']
+        )
+        self.first_copies = {}
+
+        for copy in copies:
+            self.first_copies.setdefault(copy.book_id, copy.id)
+
+        return books
+
+    def create_users(self):
+        prefix = self.options['prefix']
+        # Hashing once keeps thousands of users fast to create; they all share the password.
+        password = make_password(self.options['password'])
+        users = User.objects.bulk_create(
+            [User(username=f'{prefix}-reader-{i}', password=password, is_reader=True)
+             for i in range(self.options['readers'])]
+            + [User(username=f'{prefix}-librarian-{i}', password=password, is_librarian=True, is_staff=True)
+               for i in range(self.options['librarians'])],
+            batch_size=self.options['batch_size'],
+        )
+        readers = Reader.objects.bulk_create(
+            [Reader(user=user, first_name=self.random.choice(FIRST_NAMES), last_name=self.random.choice(LAST_NAMES),
+                    address=f'{self.random.randint(1, 200)} {self.random.choice(TITLE_WORDS)} Street')
+             for user in users if user.is_reader],
+            batch_size=self.options['batch_size'],
+        )
+        Librarian.objects.bulk_create(
+            Librarian(user=user, employee_id=f'{prefix}-{user.pk}') for user in users if user.is_librarian
+        )
+
+        return readers
+
+    def loans_per_book(self, book_count):
+        """
+        Spread the loans over books by Zipf popularity.
+
+        A book cannot be lent more often than its loans fit in ``--days``; the
+        excess goes to the next most popular books.
+        """
+
+        capacity = max(self.options['days'] * 2 // (LOAN_DAYS + LOAN_DAYS // 3), 1)
+        counts = Counter(self.random.choices(
+            range(book_count), cum_weights=zipf_cum_weights(book_count, self.options['skew']), k=self.options['loans']
+        ))
+        overflow = 0
+
+        for index in range(book_count):
+            count = counts[index] + overflow
+            counts[index] = min(count, capacity)
+            overflow = count - counts[index]
+
+        if overflow:
+
+            raise CommandError(f'{self.options["loans"]} loans do not fit in {self.options["days"]} days '
+                               f'of history for {book_count} books.')
+
+        return +counts
+
+    def create_loans(self, books, readers):
+        # Shuffle so popularity does not follow insertion order.
+        books = self.random.sample(books, len(books))
+        readers = self.random.sample(readers, len(readers))
+        loans_per_book = self.loans_per_book(len(books))
+        reader_weights = zipf_cum_weights(len(readers), self.options['reader_skew'])
+        today = timezone.localdate()
+        borrowings = []
+
+        # Each book's loans follow one another on its first copy, walking back in time from the latest one.
+        for index, count in loans_per_book.items():
+            end = today - timedelta(days=self.random.randint(0, 14))
+            is_open = self.random.random() < self.options['open_ratio']
+
+            for reader in self.random.choices(readers, cum_weights=reader_weights, k=count):
+                borrowed_date = end - timedelta(days=self.random.randint(1, LOAN_DAYS))
+                borrowings.append(Borrowing(
+                    book=books[index], copy_id=self.first_copies[books[index].id], reader=reader,
+                    borrowed_date=borrowed_date, returned_date=None if is_open else end,
+                ))
+                end = borrowed_date - timedelta(days=self.random.randint(0, LOAN_DAYS // 3))
+                is_open = False
+
+        dates = [borrowing.borrowed_date for borrowing in borrowings]
+        Borrowing.objects.bulk_create(borrowings, batch_size=self.options['batch_size'])
+
+        # borrowed_date is auto_now_add, which bulk_create() overwrites with today. One UPDATE per
+        # date is much cheaper than bulk_update()'s CASE expressions.
+        ids_by_date = defaultdict(list)
+
+        for borrowing, borrowed_date in zip(borrowings, dates):
+            ids_by_date[borrowed_date].append(borrowing.pk)
+
+        batch_size = self.options['batch_size']
+
+        for borrowed_date, ids in ids_by_date.items():
+
+            for start in range(0, len(ids), batch_size):
+                Borrowing.objects.filter(pk__in=ids[start:start + batch_size]).update(borrowed_date=borrowed_date)
+
+        refresh_copy_counts()
+
+        return len(borrowings)
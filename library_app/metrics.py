@@ -0,0 +1,293 @@
+"""
+Per-route request metrics in Prometheus text format.
+
+Each process keeps its counters in memory and, when ``METRICS_DIR`` is set,
+writes them to its own JSON file there at most every ``METRICS_FLUSH_INTERVAL``
+seconds. The ``/metrics`` view sums the files of every process, so counters
+survive worker restarts and any worker can answer a scrape.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+from .db_backends.postgresql.base import pool_metrics
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+POOL_GAUGES = ('size', 'available', 'checked_out', 'waiting')
+POOL_COUNTERS = ('requests', 'timeouts', 'connections_opened', 'connections_lost')
+
+
+def new_route():
+
+    return {
+        'requests': defaultdict(int),
+        'buckets': [0] * len(DURATION_BUCKETS),
+        'duration_seconds': 0.0,
+        'queries': 0,
+        'query_seconds': 0.0,
+        'response_bytes': 0,
+    }
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.routes = defaultdict(new_route)
+        self.last_flush = 0
+        # The process id alone can be reused by a later worker and would overwrite its counters.
+        self.filename = f'{os.getpid()}-{time.time_ns()}.json'
+
+    def observe(self, route, method, status, duration, queries, query_seconds, response_bytes):
+
+        with self.lock:
+            stats = self.routes[route]
+            stats['requests'][f'{method} {status}'] += 1
+            stats['duration_seconds'] += duration
+            stats['queries'] += queries
+            stats['query_seconds'] += query_seconds
+            stats['response_bytes'] += response_bytes
+
+            for index, bound in enumerate(DURATION_BUCKETS):
+
+                if duration <= bound:
+                    stats['buckets'][index] += 1
+
+                    break
+
+        if settings.METRICS_DIR and time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def snapshot(self):
+
+        with self.lock:
+            routes = json.loads(json.dumps(self.routes))
+
+        return {'pid': os.getpid(), 'routes': routes, 'pool': pool_metrics()}
+
+    def flush(self):
+
+        if not settings.METRICS_DIR:
+
+            return
+
+        self.last_flush = time.monotonic()
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / self.filename
+        temporary = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        temporary.write_text(json.dumps(self.snapshot()))
+        # Readers never see a half-written file.
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Return the snapshots of every process, or just this one without ``METRICS_DIR``."""
+
+        if not settings.METRICS_DIR:
+
+            return [self.snapshot()]
+
+        self.flush()
+        snapshots = []
+
+        for path in Path(settings.METRICS_DIR).glob('*.json'):
+
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+
+        return snapshots
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+if hasattr(os, 'register_at_fork'):
+    # Workers forked from a preloaded master start from zero with their own file.
+    os.register_at_fork(after_in_child=registry.reset)
+
+
+def is_alive(pid):
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+
+        return False
+    except PermissionError:
+
+        return True
+
+    return True
+
+
+def label(value):
+
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def render(snapshots):
+    routes = defaultdict(new_route)
+    pool = defaultdict(dict)
+
+    for snapshot in snapshots:
+
+        for route, stats in snapshot['routes'].items():
+            total = routes[route]
+
+            for key, count in stats['requests'].items():
+                total['requests'][key] += count
+
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], stats['buckets'])]
+
+            for key in ('duration_seconds', 'queries', 'query_seconds', 'response_bytes'):
+                total[key] += stats[key]
+
+        # Gauges of exited workers are stale; their counters still count.
+        alive = is_alive(snapshot['pid'])
+
+        for alias, stats in snapshot.get('pool', {}).items():
+
+            for key in POOL_COUNTERS + (POOL_GAUGES if alive else ()):
+                pool[alias][key] = pool[alias].get(key, 0) + stats[key]
+
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+        for labels, value in samples:
+            text = ','.join(f'{key}="{label(item)}"' for key, item in labels.items())
+            lines.append(f'{name}{{{text}}} {value:g}' if text else f'{name} {value:g}')
+
+    metric('library_http_requests_total', 'counter', 'Requests by route, method and status.', [
+        ({'route': route, 'method': key.split(' ')[0], 'status': key.split(' ')[1]}, count)
+        for route, stats in sorted(routes.items()) for key, count in sorted(stats['requests'].items())
+    ])
+
+    histogram = []
+
+    for route, stats in sorted(routes.items()):
+        cumulative = 0
+
+        for bound, count in zip(DURATION_BUCKETS, stats['buckets']):
+            cumulative += count
+            histogram.append(('_bucket', {'route': route, 'le': f'{bound:g}'}, cumulative))
+
+        total = sum(stats['requests'].values())
+        histogram.append(('_bucket', {'route': route, 'le': '+Inf'}, total))
+        histogram.append(('_sum', {'route': route}, stats['duration_seconds']))
+        histogram.append(('_count', {'route': route}, total))
+
+    lines.append('# HELP library_http_request_duration_seconds Request latency by route.')
+    lines.append('# TYPE library_http_request_duration_seconds histogram')
+
+    for suffix, labels, value in histogram:
+        text = ','.join(f'{key}="{label(item)}"' for key, item in labels.items())
+        lines.append(f'library_http_request_duration_seconds{suffix}{{{text}}} {value:g}')
+
+    for key, name, help_text in (
+        ('queries', 'library_db_queries_total', 'Database queries by route.'),
+        ('query_seconds', 'library_db_query_seconds_total', 'Time spent in database queries by route.'),
+        ('response_bytes', 'library_http_response_bytes_total', 'Response body bytes by route.'),
+    ):
+        metric(name, 'counter', help_text, [({'route': route}, stats[key]) for route, stats in sorted(routes.items())])
+
+    for key in POOL_GAUGES:
+        metric(f'library_db_pool_{key}', 'gauge', f'Connection pool {key.replace("_", " ")}, summed over workers.',
+               [({'alias': alias}, stats[key]) for alias, stats in sorted(pool.items()) if key in stats])
+
+    for key in POOL_COUNTERS:
+        metric(f'library_db_pool_{key}_total', 'counter', f'Connection pool {key.replace("_", " ")}.',
+               [({'alias': alias}, stats[key]) for alias, stats in sorted(pool.items())])
+
+    return '\n'.join(lines) + '\n'
+
+
+class QueryTimer:
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+
+        try:
+
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+def record(request, response, started, timer):
+    match = getattr(request, 'resolver_match', None)
+    # Unmatched paths share one label so scanners cannot blow up the series count.
+    route = match.url_name or match.view_name if match else 'unmatched'
+    size = 0 if response.streaming else len(response.content)
+    registry.observe(route, request.method, response.status_code, time.perf_counter() - started,
+                     timer.queries, timer.seconds, size)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Record latency, database queries and time, and response size per route.
+
+    Queries run while a streaming response is consumed happen after the view
+    returns and are not counted.
+    """
+
+    def timed():
+        timer = QueryTimer()
+        stack = ExitStack()
+
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+
+        return timer, stack
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            started = time.perf_counter()
+            timer, stack = timed()
+
+            with stack:
+                response = await get_response(request)
+
+            record(request, response, started, timer)
+
+            return response
+    else:
+
+        def middleware(request):
+            started = time.perf_counter()
+            timer, stack = timed()
+
+            with stack:
+                response = get_response(request)
+
+            record(request, response, started, timer)
+
+            return response
+
+    return middleware
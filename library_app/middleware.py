@@ -0,0 +1,54 @@
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.functional import SimpleLazyObject
+
+from .authentication import token_reader
+from .models import Reader
+
+
+def get_reader(request):
+    """
+    Return the reader profile of the authenticated user, or ``None``.
+
+    Token requests take it from the access token's claims; session requests
+    find it already joined to the user by ``ReaderModelBackend``.
+    """
+
+    reader = token_reader(request)
+
+    if reader is not None or not request.user.is_authenticated:
+
+        return reader
+
+    try:
+
+        return request.user.reader
+    except Reader.DoesNotExist:
+
+        return None
+
+
+@sync_and_async_middleware
+def reader_middleware(get_response):
+    """
+    Attach a lazily evaluated ``request.reader``.
+
+    It is resolved on first access, after DRF has authenticated the request, so
+    it works for both session and token authentication. Async views must not
+    touch it: resolving it may query the database.
+    """
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            request.reader = SimpleLazyObject(lambda: get_reader(request))
+
+            return await get_response(request)
+    else:
+
+        def middleware(request):
+            request.reader = SimpleLazyObject(lambda: get_reader(request))
+
+            return get_response(request)
+
+    return middleware
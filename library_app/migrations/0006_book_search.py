@@ -0,0 +1,93 @@
+# Generated by Django 5.0.8 on 2026-10-18 19:02
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+POSTGRESQL_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    """
+    CREATE TRIGGER library_app_book_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, author, genre ON library_app_book
+    FOR EACH ROW EXECUTE FUNCTION
+    tsvector_update_trigger(search_vector, 'pg_catalog.simple', title, author, genre)
+    """,
+    "UPDATE library_app_book SET search_vector = to_tsvector('pg_catalog.simple', "
+    "coalesce(title, '') || ' ' || coalesce(author, '') || ' ' || coalesce(genre, ''))",
+    'CREATE INDEX book_search_vector_idx ON library_app_book USING gin (search_vector)',
+    'CREATE INDEX book_title_trgm_idx ON library_app_book USING gin (title gin_trgm_ops)',
+]
+
+POSTGRESQL_BACKWARD = [
+    'DROP INDEX IF EXISTS book_title_trgm_idx',
+    'DROP INDEX IF EXISTS book_search_vector_idx',
+    'DROP TRIGGER IF EXISTS library_app_book_search_vector_update ON library_app_book',
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE library_app_book_fts USING fts5(
+        title, author, genre, content='library_app_book', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER library_app_book_fts_insert AFTER INSERT ON library_app_book BEGIN
+        INSERT INTO library_app_book_fts(rowid, title, author, genre)
+        VALUES (new.id, new.title, new.author, new.genre);
+    END
+    """,
+    """
+    CREATE TRIGGER library_app_book_fts_delete AFTER DELETE ON library_app_book BEGIN
+        INSERT INTO library_app_book_fts(library_app_book_fts, rowid, title, author, genre)
+        VALUES ('delete', old.id, old.title, old.author, old.genre);
+    END
+    """,
+    """
+    CREATE TRIGGER library_app_book_fts_update AFTER UPDATE OF title, author, genre ON library_app_book BEGIN
+        INSERT INTO library_app_book_fts(library_app_book_fts, rowid, title, author, genre)
+        VALUES ('delete', old.id, old.title, old.author, old.genre);
+        INSERT INTO library_app_book_fts(rowid, title, author, genre)
+        VALUES (new.id, new.title, new.author, new.genre);
+    END
+    """,
+    "INSERT INTO library_app_book_fts(library_app_book_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS library_app_book_fts_update',
+    'DROP TRIGGER IF EXISTS library_app_book_fts_delete',
+    'DROP TRIGGER IF EXISTS library_app_book_fts_insert',
+    'DROP TABLE IF EXISTS library_app_book_fts',
+]
+
+
+def run_statements(statements):
+
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_app', '0005_book_title_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # The GIN indexes only exist on PostgreSQL; SQLite gets an FTS5 table instead. They are kept out
+        # of the model state, so that rebuilding the table on SQLite does not try to create them.
+        migrations.RunPython(
+            run_statements({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run_statements({'postgresql': POSTGRESQL_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
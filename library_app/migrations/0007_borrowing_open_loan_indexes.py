@@ -0,0 +1,45 @@
+# Generated by Django 5.0.8 on 2026-10-18 19:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def close_duplicate_open_loans(apps, schema_editor):
+    # Older code could lend one book twice; keep the latest loan open so the unique index can be built.
+    Borrowing = apps.get_model('library_app', 'Borrowing')
+    loans = Borrowing.objects.using(schema_editor.connection.alias)
+    duplicates = (
+        loans.filter(returned_date__isnull=True)
+        .values('book')
+        .annotate(open_loans=models.Count('id'), latest_id=models.Max('id'), latest_date=models.Max('borrowed_date'))
+        .filter(open_loans__gt=1)
+    )
+
+    for duplicate in duplicates.iterator():
+        loans.filter(book=duplicate['book'], returned_date__isnull=True).exclude(
+            id=duplicate['latest_id']
+        ).update(returned_date=duplicate['latest_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_app', '0006_book_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_open_loans, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='book',
+            name='current_borrowing',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='library_app.borrowing'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(condition=models.Q(('returned_date__isnull', True)), fields=['reader', 'borrowed_date'], name='borrowing_open_reader_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='borrowing',
+            constraint=models.UniqueConstraint(condition=models.Q(('returned_date__isnull', True)), fields=('book',), name='borrowing_one_open_loan_per_book'),
+        ),
+    ]
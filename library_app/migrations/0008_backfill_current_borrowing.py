@@ -0,0 +1,22 @@
+# Generated by Django 5.0.8 on 2026-10-18 19:10
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_current_borrowing(apps, schema_editor):
+    Book = apps.get_model('library_app', 'Book')
+    Borrowing = apps.get_model('library_app', 'Borrowing')
+    open_loan = Borrowing.objects.filter(book=OuterRef('pk'), returned_date__isnull=True).values('pk')[:1]
+    Book.objects.using(schema_editor.connection.alias).update(current_borrowing=Subquery(open_loan))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_app', '0007_borrowing_open_loan_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_current_borrowing, migrations.RunPython.noop),
+    ]
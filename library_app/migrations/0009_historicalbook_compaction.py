@@ -0,0 +1,26 @@
+# Generated by Django 5.0.8 on 2026-10-18 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_app', '0008_backfill_current_borrowing'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='historicalbook',
+            name='is_checked_out',
+        ),
+        migrations.AlterField(
+            model_name='historicalbook',
+            name='history_date',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='historicalbook',
+            index=models.Index(fields=['history_date', 'id'], name='library_app_history_b6e0f3_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.8 on 2026-10-18 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_app', '0009_historicalbook_compaction'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(condition=models.Q(('returned_date__isnull', True)), fields=['borrowed_date', 'id'], name='borrowing_open_date_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.8 on 2026-10-18 19:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_app', '0010_borrowing_open_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookCirculation',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='circulation', serialize=False, to='library_app.book')),
+                ('borrowed_date', models.DateField(blank=True, null=True)),
+                ('loan_count', models.PositiveIntegerField()),
+                ('last_returned_date', models.DateField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CirculationSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReaderCirculation',
+            fields=[
+                ('reader', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='circulation', serialize=False, to='library_app.reader')),
+                ('open_loans', models.PositiveIntegerField()),
+                ('oldest_borrowed_date', models.DateField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='borrowing',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(fields=['updated_at'], name='borrowing_updated_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='bookcirculation',
+            name='reader',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library_app.reader'),
+        ),
+        migrations.AddIndex(
+            model_name='readercirculation',
+            index=models.Index(fields=['oldest_borrowed_date', 'reader'], name='reader_circulation_oldest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookcirculation',
+            index=models.Index(condition=models.Q(('borrowed_date__isnull', False)), fields=['borrowed_date', 'book'], name='book_circulation_open_idx'),
+        ),
+    ]
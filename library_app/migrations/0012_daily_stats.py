@@ -0,0 +1,51 @@
+# Generated by Django 5.0.8 on 2026-10-18 19:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_app', '0011_circulation_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('loans', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('loan_days', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library_app.book')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GenreDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.CharField(max_length=50)),
+                ('day', models.DateField()),
+                ('loans', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('loan_days', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'genre'], name='genre_daily_stats_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='genredailystats',
+            constraint=models.UniqueConstraint(fields=('genre', 'day'), name='genre_daily_stats_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='bookdailystats',
+            index=models.Index(fields=['day', 'book'], name='book_daily_stats_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookdailystats',
+            constraint=models.UniqueConstraint(fields=('book', 'day'), name='book_daily_stats_unique'),
+        ),
+    ]
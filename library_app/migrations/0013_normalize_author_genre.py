@@ -0,0 +1,285 @@
+# Generated by Django 5.0.8 on 2026-10-18 20:00
+
+import importlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Trim
+
+
+book_search = importlib.import_module('library_app.migrations.0006_book_search')
+
+POSTGRESQL_DROP_TEXT_SEARCH = [
+    'DROP TRIGGER IF EXISTS library_app_book_search_vector_update ON library_app_book',
+]
+
+SQLITE_DROP_TEXT_SEARCH = book_search.SQLITE_BACKWARD
+
+POSTGRESQL_FORWARD = [
+    """
+    CREATE FUNCTION library_app_book_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('pg_catalog.simple', concat_ws(' ', NEW.title,
+            (SELECT name FROM library_app_author WHERE id = NEW.author_id),
+            (SELECT name FROM library_app_genre WHERE id = NEW.genre_id)));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER library_app_book_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, author_id, genre_id ON library_app_book
+    FOR EACH ROW EXECUTE FUNCTION library_app_book_search_vector()
+    """,
+    # Renaming an author or genre touches its books, which fires the trigger above.
+    """
+    CREATE FUNCTION library_app_book_name_changed() RETURNS trigger AS $$
+    BEGIN
+        EXECUTE format('UPDATE library_app_book SET title = title WHERE %I = $1', TG_ARGV[0]) USING NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER library_app_author_search_vector_update
+    AFTER UPDATE OF name ON library_app_author
+    FOR EACH ROW EXECUTE FUNCTION library_app_book_name_changed('author_id')
+    """,
+    """
+    CREATE TRIGGER library_app_genre_search_vector_update
+    AFTER UPDATE OF name ON library_app_genre
+    FOR EACH ROW EXECUTE FUNCTION library_app_book_name_changed('genre_id')
+    """,
+    'UPDATE library_app_book SET title = title',
+]
+
+POSTGRESQL_BACKWARD = [
+    'DROP TRIGGER IF EXISTS library_app_genre_search_vector_update ON library_app_genre',
+    'DROP TRIGGER IF EXISTS library_app_author_search_vector_update ON library_app_author',
+    'DROP TRIGGER IF EXISTS library_app_book_search_vector_update ON library_app_book',
+    'DROP FUNCTION IF EXISTS library_app_book_name_changed()',
+    'DROP FUNCTION IF EXISTS library_app_book_search_vector()',
+]
+
+# The names now live in other tables, so the FTS5 table keeps its own copy instead of
+# reading library_app_book as external content.
+SQLITE_FORWARD = [
+    'CREATE VIRTUAL TABLE library_app_book_fts USING fts5(title, author, genre)',
+    """
+    CREATE TRIGGER library_app_book_fts_insert AFTER INSERT ON library_app_book BEGIN
+        INSERT INTO library_app_book_fts(rowid, title, author, genre) VALUES (
+            new.id, new.title,
+            (SELECT name FROM library_app_author WHERE id = new.author_id),
+            (SELECT name FROM library_app_genre WHERE id = new.genre_id)
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER library_app_book_fts_delete AFTER DELETE ON library_app_book BEGIN
+        DELETE FROM library_app_book_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER library_app_book_fts_update AFTER UPDATE OF title, author_id, genre_id ON library_app_book BEGIN
+        UPDATE library_app_book_fts SET
+            title = new.title,
+            author = (SELECT name FROM library_app_author WHERE id = new.author_id),
+            genre = (SELECT name FROM library_app_genre WHERE id = new.genre_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER library_app_author_fts_update AFTER UPDATE OF name ON library_app_author BEGIN
+        UPDATE library_app_book_fts SET author = new.name
+        WHERE rowid IN (SELECT id FROM library_app_book WHERE author_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER library_app_genre_fts_update AFTER UPDATE OF name ON library_app_genre BEGIN
+        UPDATE library_app_book_fts SET genre = new.name
+        WHERE rowid IN (SELECT id FROM library_app_book WHERE genre_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO library_app_book_fts(rowid, title, author, genre)
+    SELECT book.id, book.title, author.name, genre.name FROM library_app_book book
+    LEFT JOIN library_app_author author ON author.id = book.author_id
+    LEFT JOIN library_app_genre genre ON genre.id = book.genre_id
+    """,
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS library_app_genre_fts_update',
+    'DROP TRIGGER IF EXISTS library_app_author_fts_update',
+    'DROP TRIGGER IF EXISTS library_app_book_fts_update',
+    'DROP TRIGGER IF EXISTS library_app_book_fts_delete',
+    'DROP TRIGGER IF EXISTS library_app_book_fts_insert',
+    'DROP TABLE IF EXISTS library_app_book_fts',
+]
+
+
+def backfill_names(apps, schema_editor):
+    """Create one Author and Genre per distinct name in the catalog and its history, and point rows at them."""
+
+    alias = schema_editor.connection.alias
+    Book = apps.get_model('library_app', 'Book')
+    HistoricalBook = apps.get_model('library_app', 'HistoricalBook')
+
+    for model_name, field in (('Author', 'author'), ('Genre', 'genre')):
+        model = apps.get_model('library_app', model_name)
+        names = set()
+
+        for source in (Book, HistoricalBook):
+            names.update(
+                source.objects.using(alias).annotate(name=Trim(f'{field}_name')).values_list('name', flat=True).distinct()
+            )
+
+        model.objects.using(alias).bulk_create([model(name=name) for name in names], batch_size=1000)
+        name_id = model.objects.filter(name=Trim(OuterRef(f'{field}_name'))).values('id')[:1]
+
+        for source in (Book, HistoricalBook):
+            source.objects.using(alias).update(**{field: Subquery(name_id)})
+
+
+def restore_names(apps, schema_editor):
+    alias = schema_editor.connection.alias
+
+    for model_name in ('Book', 'HistoricalBook'):
+        model = apps.get_model('library_app', model_name)
+        model.objects.using(alias).update(
+            author_name=Subquery(apps.get_model('library_app', 'Author').objects.filter(
+                id=OuterRef('author_id')).values('name')[:1]),
+            genre_name=Subquery(apps.get_model('library_app', 'Genre').objects.filter(
+                id=OuterRef('genre_id')).values('name')[:1]),
+        )
+
+
+def clear_circulation_stats(apps, schema_editor):
+    # The genre rollups are rebuilt from the loans by the next refresh_circulation_snapshot run,
+    # which does a full rebuild when no snapshot time is recorded.
+    apps.get_model('library_app', 'CirculationSnapshot').objects.using(schema_editor.connection.alias).delete()
+
+
+def run_statements(statements):
+
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_app', '0012_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Author',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        # The text search triggers read the old columns; they are recreated once the new ones are filled.
+        migrations.RunPython(
+            run_statements({'postgresql': POSTGRESQL_DROP_TEXT_SEARCH, 'sqlite': SQLITE_DROP_TEXT_SEARCH}),
+            run_statements({'postgresql': book_search.POSTGRESQL_FORWARD[1:3], 'sqlite': book_search.SQLITE_FORWARD}),
+        ),
+        migrations.RenameField(model_name='book', old_name='author', new_name='author_name'),
+        migrations.RenameField(model_name='book', old_name='genre', new_name='genre_name'),
+        migrations.RenameField(model_name='historicalbook', old_name='author', new_name='author_name'),
+        migrations.RenameField(model_name='historicalbook', old_name='genre', new_name='genre_name'),
+        migrations.AddField(
+            model_name='book',
+            name='author',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='books', to='library_app.author'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='genre',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='books', to='library_app.genre'),
+        ),
+        migrations.AddField(
+            model_name='historicalbook',
+            name='author',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='library_app.author'),
+        ),
+        migrations.AddField(
+            model_name='historicalbook',
+            name='genre',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='library_app.genre'),
+        ),
+        # Nullable while they are emptied, so that unwinding the migration can add them back before filling them in.
+        migrations.AlterField(
+            model_name='book',
+            name='author_name',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='genre_name',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='historicalbook',
+            name='author_name',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='historicalbook',
+            name='genre_name',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.RunPython(backfill_names, restore_names),
+        migrations.RemoveField(model_name='book', name='author_name'),
+        migrations.RemoveField(model_name='book', name='genre_name'),
+        migrations.RemoveField(model_name='historicalbook', name='author_name'),
+        migrations.RemoveField(model_name='historicalbook', name='genre_name'),
+        migrations.AlterField(
+            model_name='book',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='books', to='library_app.author'),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='genre',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='books', to='library_app.genre'),
+        ),
+        migrations.RunPython(
+            run_statements({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run_statements({'postgresql': POSTGRESQL_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+        migrations.RunPython(clear_circulation_stats, migrations.RunPython.noop),
+        migrations.DeleteModel(name='GenreDailyStats'),
+        migrations.CreateModel(
+            name='GenreDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('loans', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('loan_days', models.PositiveIntegerField(default=0)),
+                ('genre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library_app.genre')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'genre'], name='genre_daily_stats_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='genredailystats',
+            constraint=models.UniqueConstraint(fields=('genre', 'day'), name='genre_daily_stats_unique'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.8 on 2026-10-18 20:16
+
+import importlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+normalize_author_genre = importlib.import_module('library_app.migrations.0013_normalize_author_genre')
+
+# Rebuilding library_app_book on SQLite drops the triggers that keep its FTS5 table in sync,
+# so they are dropped before the operations that rebuild it and created again afterwards.
+SQLITE_DROP_TRIGGERS = normalize_author_genre.SQLITE_BACKWARD[:-1]
+
+SQLITE_CREATE_TRIGGERS = normalize_author_genre.SQLITE_FORWARD[1:-1]
+
+
+def rebuilding_book(*operations):
+    drop_triggers = normalize_author_genre.run_statements({'sqlite': SQLITE_DROP_TRIGGERS})
+    create_triggers = normalize_author_genre.run_statements({'sqlite': SQLITE_CREATE_TRIGGERS})
+
+    return [
+        migrations.RunPython(drop_triggers, create_triggers),
+        *operations,
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_app', '0014_book_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Copy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='copies', to='library_app.book')),
+            ],
+            options={
+                'verbose_name_plural': 'copies',
+            },
+        ),
+        *rebuilding_book(
+            migrations.AddField(
+                model_name='book',
+                name='total_copies',
+                field=models.PositiveIntegerField(default=0, editable=False),
+            ),
+            migrations.AddField(
+                model_name='book',
+                name='available_copies',
+                field=models.PositiveIntegerField(default=0, editable=False),
+            ),
+        ),
+        migrations.AddField(
+            model_name='borrowing',
+            name='copy',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='borrowings', to='library_app.copy'),
+        ),
+    ]
@@ -0,0 +1,190 @@
+# Generated by Django 5.0.8 on 2026-10-18 20:16
+
+import importlib
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Count, Exists, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+
+book_copies = importlib.import_module('library_app.migrations.0015_book_copies')
+
+
+STATS_FIELDS = ['loans', 'returns', 'loan_days']
+
+
+def duplicate_books(Book, Borrowing, alias):
+    """
+    Map each book to the lowest-numbered book with the same title, author and genre.
+
+    A duplicate stays on its own when one of its readers already holds another
+    copy of the title, as one reader cannot have two open loans of a book.
+    """
+
+    keep = {}
+    merged = {}
+    holders = defaultdict(set)
+
+    for book_id, reader_id in Borrowing.objects.using(alias).filter(returned_date__isnull=True).values_list(
+        'book_id', 'reader_id'
+    ):
+        holders[book_id].add(reader_id)
+
+    for book_id, title, author_id, genre_id in Book.objects.using(alias).order_by('id').values_list(
+        'id', 'title', 'author_id', 'genre_id'
+    ):
+        kept_id = keep.setdefault((title, author_id, genre_id), book_id)
+
+        if kept_id != book_id and not holders[kept_id] & holders[book_id]:
+            merged[book_id] = kept_id
+            holders[kept_id] |= holders[book_id]
+
+    return merged
+
+
+def merge_books(apps, alias, merged):
+    Book = apps.get_model('library_app', 'Book')
+    BookDailyStats = apps.get_model('library_app', 'BookDailyStats')
+    book_ids = sorted(merged)
+
+    for start in range(0, len(book_ids), 500):
+        batch = book_ids[start:start + 500]
+        kept_id = Case(*[When(book_id=book_id, then=Value(merged[book_id])) for book_id in batch])
+
+        for model_name in ('Copy', 'Borrowing'):
+            apps.get_model('library_app', model_name).objects.using(alias).filter(book_id__in=batch).update(
+                book_id=kept_id
+            )
+
+        stats = defaultdict(lambda: dict.fromkeys(STATS_FIELDS, 0))
+        rows = BookDailyStats.objects.using(alias).filter(book_id__in=batch + [merged[book_id] for book_id in batch])
+
+        for book_id, day, *values in rows.values_list('book_id', 'day', *STATS_FIELDS):
+            cell = stats[merged.get(book_id, book_id), day]
+
+            for field, value in zip(STATS_FIELDS, values):
+                cell[field] += value
+
+        rows.delete()
+        BookDailyStats.objects.using(alias).bulk_create(
+            BookDailyStats(book_id=book_id, day=day, **values) for (book_id, day), values in stats.items()
+        )
+        Book.objects.using(alias).filter(id__in=batch).delete()
+
+
+# Runs after 0015 has committed, so the index on Copy.book that the loans are matched by exists.
+def create_copies(apps, schema_editor):
+    """
+    Give every book one copy, lent by its existing loans, then merge books with the same title, author and genre.
+
+    The merged books' copies, loans and daily statistics move to the kept book.
+    """
+
+    alias = schema_editor.connection.alias
+    Book = apps.get_model('library_app', 'Book')
+    Borrowing = apps.get_model('library_app', 'Borrowing')
+    Copy = apps.get_model('library_app', 'Copy')
+    book_ids = Book.objects.using(alias).order_by('id').values_list('id', flat=True)
+
+    for start in range(0, len(book_ids), 1000):
+        Copy.objects.using(alias).bulk_create([Copy(book_id=book_id) for book_id in book_ids[start:start + 1000]])
+
+    Borrowing.objects.using(alias).update(
+        copy=Subquery(Copy.objects.filter(book=OuterRef('book')).values('id')[:1])
+    )
+    merge_books(apps, alias, duplicate_books(Book, Borrowing, alias))
+
+    # As services.refresh_copy_counts().
+    copies = Copy.objects.filter(book=OuterRef('pk')).order_by().values('book')
+    open_loans = Borrowing.objects.filter(copy=OuterRef('pk'), returned_date__isnull=True)
+
+    def count(queryset):
+
+        return Coalesce(Subquery(queryset.annotate(count=Count('id')).values('count')), 0)
+
+    Book.objects.using(alias).update(
+        total_copies=count(copies), available_copies=count(copies.exclude(Exists(open_loans)))
+    )
+
+
+def restore_checked_out(apps, schema_editor):
+    # Merged books stay merged. Unwinding fails on the per-book constraint while one is lent more than once.
+    Book = apps.get_model('library_app', 'Book')
+    open_loans = apps.get_model('library_app', 'Borrowing').objects.filter(
+        book=OuterRef('pk'), returned_date__isnull=True
+    ).order_by('id')
+    Book.objects.using(schema_editor.connection.alias).update(
+        is_checked_out=Exists(open_loans), current_borrowing=Subquery(open_loans.values('id')[:1])
+    )
+
+
+def clear_circulation_snapshot(apps, schema_editor):
+    # Open loans move to LoanCirculation, which the next refresh_circulation_snapshot run fills
+    # with a full rebuild, as no snapshot time is recorded.
+    apps.get_model('library_app', 'CirculationSnapshot').objects.using(schema_editor.connection.alias).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library_app', '0015_book_copies'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='borrowing',
+            name='borrowing_one_open_loan_per_book',
+        ),
+        migrations.RunPython(create_copies, restore_checked_out),
+        migrations.AddConstraint(
+            model_name='borrowing',
+            constraint=models.UniqueConstraint(condition=models.Q(('returned_date__isnull', True)), fields=('copy',), name='borrowing_one_open_loan_per_copy'),
+        ),
+        migrations.AddConstraint(
+            model_name='borrowing',
+            constraint=models.UniqueConstraint(condition=models.Q(('returned_date__isnull', True)), fields=('book', 'reader'), name='borrowing_one_open_loan_per_reader'),
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_available_title_idx',
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('available_copies__gt', 0)), fields=['title', 'id'], name='book_available_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('available_copies', 0)), fields=['title', 'id'], name='book_unavailable_title_idx'),
+        ),
+        *book_copies.rebuilding_book(
+            migrations.RemoveField(model_name='book', name='current_borrowing'),
+            migrations.RemoveField(model_name='book', name='is_checked_out'),
+        ),
+        migrations.RunPython(clear_circulation_snapshot, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='bookcirculation',
+            name='book_circulation_open_idx',
+        ),
+        migrations.RemoveField(
+            model_name='bookcirculation',
+            name='borrowed_date',
+        ),
+        migrations.RemoveField(
+            model_name='bookcirculation',
+            name='reader',
+        ),
+        migrations.CreateModel(
+            name='LoanCirculation',
+            fields=[
+                ('borrowing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='library_app.borrowing')),
+                ('borrowed_date', models.DateField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library_app.book')),
+                ('reader', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library_app.reader')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['borrowed_date', 'borrowing'], name='loan_circulation_date_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import timezone
 
@@ -30,23 +31,104 @@ class Reader(models.Model):
         return f"{self.first_name} {self.last_name}"
 
 
+class NameQuerySet(models.QuerySet):
+
+    def ids_for(self, names):
+        """Map each of ``names`` to its row id, creating the rows that do not exist yet."""
+
+        names = set(names)
+        self.bulk_create([self.model(name=name) for name in names], ignore_conflicts=True)
+
+        return dict(self.filter(name__in=names).values_list('name', 'id'))
+
+
+class CatalogName(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+
+    objects = NameQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+
+        return self.name
+
+
+class Author(CatalogName):
+    pass
+
+
+class Genre(CatalogName):
+    pass
+
+
 class Book(models.Model):
     title = models.CharField(max_length=50)
-    author = models.CharField(max_length=50)
-    genre = models.CharField(max_length=50)
-    is_checked_out = models.BooleanField(default=False)
-    history = HistoricalRecords()
+    author = models.ForeignKey(Author, on_delete=models.PROTECT, related_name='books')
+    genre = models.ForeignKey(Genre, on_delete=models.PROTECT, related_name='books')
+    # Counts of this book's copies, kept up to date by the services with F() updates.
+    total_copies = models.PositiveIntegerField(default=0, editable=False)
+    available_copies = models.PositiveIntegerField(default=0, editable=False)
+    # Maintained by a database trigger and GIN-indexed on PostgreSQL only, see migration 0006.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Circulation state is recorded by Borrowing, so it is not part of the catalog history.
+    history = HistoricalRecords(excluded_fields=['total_copies', 'available_copies', 'search_vector'])
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+            # Filtered catalog pages: the filter column, then the keyset ordering.
+            models.Index(fields=['genre', 'title', 'id'], name='book_genre_title_idx'),
+            models.Index(fields=['author', 'title', 'id'], name='book_author_title_idx'),
+            models.Index(fields=['title', 'id'], condition=models.Q(available_copies__gt=0),
+                         name='book_available_title_idx'),
+            models.Index(fields=['title', 'id'], condition=models.Q(available_copies=0),
+                         name='book_unavailable_title_idx'),
+        ]
 
     def __str__(self):
 
         return self.title
 
 
+class Copy(models.Model):
+    """A physical copy of a book; it is on loan while it has an open ``Borrowing``."""
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='copies')
+
+    class Meta:
+        verbose_name_plural = 'copies'
+
+    def __str__(self):
+
+        return f"{self.book} #{self.pk}"
+
+
 class Borrowing(models.Model):
     reader = models.ForeignKey(Reader, on_delete=models.CASCADE)
+    # The book is kept next to the copy so per-book queries need no join. Loans outlive deleted copies.
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    copy = models.ForeignKey(Copy, on_delete=models.SET_NULL, null=True, blank=True, related_name='borrowings')
     borrowed_date = models.DateField(auto_now_add=True)
     returned_date = models.DateField(null=True, blank=True)
+    # Queryset update() calls must set this too; refresh_circulation_snapshot picks up changed loans by it.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['copy'], condition=models.Q(returned_date__isnull=True),
+                                    name='borrowing_one_open_loan_per_copy'),
+            models.UniqueConstraint(fields=['book', 'reader'], condition=models.Q(returned_date__isnull=True),
+                                    name='borrowing_one_open_loan_per_reader'),
+        ]
+        indexes = [
+            models.Index(fields=['reader', 'borrowed_date'], condition=models.Q(returned_date__isnull=True),
+                         name='borrowing_open_reader_idx'),
+            models.Index(fields=['borrowed_date', 'id'], condition=models.Q(returned_date__isnull=True),
+                         name='borrowing_open_date_idx'),
+            models.Index(fields=['updated_at'], name='borrowing_updated_at_idx'),
+        ]
 
     def is_returned(self):
 
@@ -59,8 +141,86 @@ class Borrowing(models.Model):
             return (self.returned_date - self.borrowed_date).days
         else:
 
-            return (timezone.now().date() - self.borrowed_date).days
+            return (timezone.localdate() - self.borrowed_date).days
 
     def __str__(self):
 
         return f"{self.reader} borrowed {self.book} on {self.borrowed_date}"
+
+
+class CirculationSnapshot(models.Model):
+    """A single row recording when ``refresh_circulation_snapshot`` last started."""
+
+    refreshed_at = models.DateTimeField()
+
+
+class ReaderCirculation(models.Model):
+    """Snapshot of a reader's open loans; readers without any have no row."""
+
+    reader = models.OneToOneField(Reader, on_delete=models.CASCADE, primary_key=True, related_name='circulation')
+    open_loans = models.PositiveIntegerField()
+    oldest_borrowed_date = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['oldest_borrowed_date', 'reader'], name='reader_circulation_oldest_idx'),
+        ]
+
+
+class BookCirculation(models.Model):
+    """Snapshot of a book's loan history; books never lent have no row."""
+
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='circulation')
+    loan_count = models.PositiveIntegerField()
+    last_returned_date = models.DateField(null=True, blank=True)
+
+
+class LoanCirculation(models.Model):
+    """Snapshot of an open loan; returned loans have no row."""
+
+    borrowing = models.OneToOneField(Borrowing, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    reader = models.ForeignKey(Reader, on_delete=models.CASCADE, related_name='+')
+    borrowed_date = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['borrowed_date', 'borrowing'], name='loan_circulation_date_idx'),
+        ]
+
+
+class BookDailyStats(models.Model):
+    """Loans started and ended per book and day, maintained by ``refresh_circulation_snapshot``."""
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    loans = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    # Total length in days of the loans returned that day.
+    loan_days = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'day'], name='book_daily_stats_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'book'], name='book_daily_stats_day_idx'),
+        ]
+
+
+class GenreDailyStats(models.Model):
+    """``BookDailyStats`` summed per genre and day."""
+
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    loans = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    loan_days = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['genre', 'day'], name='genre_daily_stats_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'genre'], name='genre_daily_stats_day_idx'),
+        ]
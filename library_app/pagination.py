@@ -0,0 +1,186 @@
+import base64
+import json
+from functools import reduce
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    """
+    Cursor pagination over a unique ordering such as ``('title', 'id')``.
+
+    Pages are located with ``title > t OR (title = t AND id > i)`` on the
+    cursor's position instead of OFFSET, so the ordering must be backed by a
+    matching composite index.
+    """
+
+    ordering = ('title', 'id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def __init__(self, ordering=None):
+
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+
+        self.page_size = settings.CATALOG_PAGE_SIZE
+        self.max_page_size = settings.CATALOG_MAX_PAGE_SIZE
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    def get_page_size(self, request):
+
+        try:
+            page_size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+
+            return self.page_size
+
+        if page_size <= 0:
+
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, obj, reverse=False):
+        position = [getattr(obj, field) for field in self.ordering]
+        data = json.dumps({'p': position, 'r': reverse}, separators=(',', ':'), cls=DjangoJSONEncoder)
+
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, model):
+
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            position = data['p']
+            reverse = bool(data['r'])
+        except (ValueError, KeyError, TypeError):
+
+            raise Http404('Invalid cursor')
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+
+            raise Http404('Invalid cursor')
+
+        try:
+            position = [self.position_value(model, field, value) for field, value in zip(self.ordering, position)]
+        except (ValueError, TypeError, OverflowError, ValidationError):
+
+            raise Http404('Invalid cursor')
+
+        return position, reverse
+
+    def position_value(self, model, field, value):
+        # Cursors come from the client; convert and range-check them like the ordering fields' own values.
+        field = model._meta.get_field(field)
+        value = field.to_python(value)
+
+        if value is None:
+
+            raise ValueError('Cursor positions cannot be null.')
+
+        field.run_validators(value)
+
+        return value
+
+    def position_filter(self, position, reverse):
+        lookup = 'lt' if reverse else 'gt'
+        conditions = []
+
+        for index, field in enumerate(self.ordering):
+            equal = {name: value for name, value in zip(self.ordering[:index], position[:index])}
+            conditions.append(Q(**equal, **{f'{field}__{lookup}': position[index]}))
+
+        return reduce(lambda left, right: left | right, conditions)
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.current_page_size = self.get_page_size(request)
+        cursor = request.GET.get(self.cursor_query_param)
+        self.position, self.reverse = self.decode_cursor(cursor, queryset.model) if cursor else (None, False)
+
+        if self.reverse:
+            order_by = [f'-{field}' for field in self.ordering]
+        else:
+            order_by = list(self.ordering)
+
+        queryset = queryset.order_by(*order_by)
+
+        if self.position is not None:
+            queryset = queryset.filter(self.position_filter(self.position, self.reverse))
+
+        return queryset[:self.current_page_size + 1]
+
+    def get_page_results(self, results):
+        has_more = len(results) > self.current_page_size
+        results = results[:self.current_page_size]
+
+        if self.reverse:
+            results.reverse()
+            has_next = self.position is not None
+            has_previous = has_more
+        else:
+            has_next = has_more
+            has_previous = self.position is not None
+
+        self.next_cursor = self.encode_cursor(results[-1]) if has_next and results else None
+        self.previous_cursor = self.encode_cursor(results[0], reverse=True) if has_previous and results else None
+
+        return results
+
+    def paginate_queryset(self, queryset, request, view=None):
+
+        return self.get_page_results(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+
+        return self.get_page_results([obj async for obj in self.get_page_queryset(queryset, request).aiterator()])
+
+    def get_link(self, cursor):
+
+        if cursor is None:
+
+            return None
+
+        url = self.request.build_absolute_uri()
+
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+
+        return self.get_link(self.next_cursor)
+
+    def get_previous_link(self):
+
+        return self.get_link(self.previous_cursor)
+
+    def get_paginated_data(self, data):
+
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+
+        return Response(self.get_paginated_data(data))
+
+
+class SearchPagination(LimitOffsetPagination):
+    """
+    Ranked search results have no stable keyset, so they are paged by offset.
+    """
+
+    def __init__(self):
+        self.default_limit = settings.CATALOG_PAGE_SIZE
+        self.max_limit = settings.CATALOG_MAX_PAGE_SIZE
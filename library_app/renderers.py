@@ -0,0 +1,103 @@
+from django.conf import settings
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson, falling back to the stdlib when it is not installed.
+
+    ``date``/``datetime`` values are encoded natively; anything else orjson does
+    not know goes through DRF's encoder, and indented output uses the parent class.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+
+        if orjson is None or self.ensure_ascii:
+
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+
+            return b''
+
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=encoders.JSONEncoder().default, option=orjson.OPT_UTC_Z)
+        except TypeError:
+
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Keep the output a strict JavaScript subset, like JSONRenderer does.
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    Selects the export format during content negotiation (``?format=`` or Accept).
+
+    Export views stream their own ``StreamingHttpResponse``, so ``render`` is only
+    reached for error responses, which are rendered as JSON. Text passed as
+    ``data`` is sent as is.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+
+        if isinstance(data, str):
+
+            return data.encode(self.charset)
+
+        response = (renderer_context or {}).get('response')
+
+        if response is not None:
+            response['Content-Type'] = FastJSONRenderer.media_type
+
+        return FastJSONRenderer().render(data, renderer_context=renderer_context)
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(StreamingRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class PrometheusRenderer(StreamingRenderer):
+    """Prometheus text exposition format; the view passes the rendered text as ``data``."""
+
+    media_type = 'text/plain'
+    format = 'prometheus'
@@ -0,0 +1,75 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+_target = ContextVar('library_db_target', default=PRIMARY)
+
+
+@contextmanager
+def _route(target):
+    token = _target.set(target)
+
+    try:
+        yield
+    finally:
+        _target.reset(token)
+
+
+def replica_reads():
+    """
+    Send reads made inside the block to a replica, if any are configured.
+
+    Works as a context manager and as a decorator for sync views. The first
+    write inside the block pins the rest of it to the primary, so a request
+    reads back what it has just written.
+    """
+
+    return _route(REPLICA)
+
+
+def pin_to_primary():
+    """Keep every query inside the block on the primary, even within ``replica_reads()``."""
+
+    return _route(PRIMARY)
+
+
+class ReplicaRouter:
+    """
+    Route reads to ``settings.DATABASE_REPLICAS`` inside ``replica_reads()``.
+
+    Everything else goes to ``default``: reads outside the block, reads inside
+    a transaction, and sessions and users, which must never lag behind a login.
+    """
+
+    primary_only_apps = {'admin', 'auth', 'contenttypes', 'sessions'}
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+
+        if (
+            not replicas
+            or _target.get() != REPLICA
+            or model._meta.app_label in self.primary_only_apps
+            or model._meta.label == settings.AUTH_USER_MODEL
+            or connections['default'].in_atomic_block
+        ):
+
+            return None
+
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _target.set(PRIMARY)
+
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+
+        return True
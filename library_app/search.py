@@ -0,0 +1,70 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Book
+
+
+FTS_TABLE = 'library_app_book_fts'
+
+
+def tokenize(text):
+
+    return re.findall(r'\w+', text.lower())
+
+
+def search_books(text, queryset=None):
+    """
+    Rank books matching ``text`` against title, author and genre.
+
+    PostgreSQL uses the ``search_vector`` GIN index plus trigram similarity on
+    the title to tolerate typos. SQLite falls back to the FTS5 table created
+    by migration 0006 with prefix matching.
+    """
+
+    if queryset is None:
+        queryset = Book.objects.all()
+
+    tokens = tokenize(text)
+
+    if not tokens:
+
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'postgresql':
+
+        return _search_postgresql(queryset, text, tokens)
+
+    if vendor == 'sqlite':
+
+        return _search_sqlite(queryset, tokens)
+
+    return queryset.filter(
+        Q(title__icontains=text) | Q(author__name__icontains=text) | Q(genre__name__icontains=text)
+    ).order_by('title', 'id')
+
+
+def _search_postgresql(queryset, text, tokens):
+    query = SearchQuery(' & '.join(f'{token}:*' for token in tokens), config='simple', search_type='raw')
+
+    return queryset.annotate(
+        rank=SearchRank(F('search_vector'), query) + TrigramSimilarity('title', text),
+    ).filter(
+        Q(search_vector=query) | Q(title__trigram_similar=text)
+    ).order_by('-rank', 'id')
+
+
+def _search_sqlite(queryset, tokens):
+    match = ' '.join(f'"{token}"*' for token in tokens)
+    rank = RawSQL(
+        f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = library_app_book.id',
+        [match],
+    )
+    matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+
+    return queryset.filter(id__in=matches).annotate(rank=rank).order_by('-rank', 'id')
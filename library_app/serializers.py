@@ -1,12 +1,28 @@
+from django.db.models import DateField, F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
 from rest_framework import serializers
 
+from .expressions import DaysBetween
 from .models import Book, Borrowing
 
 
 class BookSerializer(serializers.ModelSerializer):
+    # Flat names, as before authors and genres had their own tables.
+    author = serializers.CharField(source='author.name', read_only=True)
+    genre = serializers.CharField(source='genre.name', read_only=True)
+
     class Meta:
         model = Book
-        fields = ['id', 'title', 'author', 'genre']
+        fields = ['id', 'title', 'author', 'genre', 'total_copies', 'available_copies']
+
+
+class BookSearchSerializer(BookSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(BookSerializer.Meta):
+        fields = BookSerializer.Meta.fields + ['rank']
 
 
 class BorrowingSerializer(serializers.ModelSerializer):
@@ -20,3 +36,44 @@ class BorrowingSerializer(serializers.ModelSerializer):
     def get_days_borrowed(self, obj):
 
         return obj.days_borrowed()
+
+
+class BorrowingValuesSerializer:
+    """
+    Read-only counterpart of ``BorrowingSerializer(many=True)`` for list endpoints.
+
+    Rows come straight from ``values()``: the book title is joined and the
+    days borrowed are computed in SQL, so no model instances are built.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def get_rows(self):
+        today = Value(timezone.localdate(), output_field=DateField())
+
+        # values() stays lazy under aiterator(); values_list() with interleaved annotations does not in Django 5.0.
+        return self.queryset.annotate(
+            book_title=F('book__title'),
+            days_borrowed=DaysBetween(Coalesce('returned_date', today), 'borrowed_date'),
+        ).values('id', 'borrowed_date', 'book_title', 'days_borrowed')
+
+    @property
+    def data(self):
+
+        return list(self.get_rows())
+
+    async def adata(self):
+
+        return [row async for row in self.get_rows().aiterator()]
+
+
+class BookIdsSerializer(serializers.Serializer):
+    book_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=100)
+
+
+class BatchItemSerializer(serializers.Serializer):
+    book_id = serializers.IntegerField()
+    success = serializers.BooleanField()
+    borrowing = BorrowingSerializer(required=False)
+    error = serializers.CharField(required=False)
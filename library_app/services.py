@@ -0,0 +1,267 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import Book, Borrowing, Copy
+
+
+BOOK_NOT_FOUND = 'Book not found'
+BOOK_ALREADY_BORROWED = 'Book is already borrowed'
+BOOK_NOT_BORROWED = 'Book is not borrowed'
+BORROWING_NOT_FOUND = 'Borrowing record not found'
+
+
+class CirculationError(Exception):
+    not_found = False
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class NotFoundError(CirculationError):
+    not_found = True
+
+
+def _open_loans(**filters):
+
+    return Borrowing.objects.filter(returned_date__isnull=True, **filters)
+
+
+def _free_copies(book_ids):
+    """Map each book to one of its copies that is not on loan."""
+
+    copies = Copy.objects.filter(book_id__in=book_ids).exclude(Exists(_open_loans(copy=OuterRef('pk'))))
+    free = {}
+
+    for book_id, copy_id in copies.order_by('id').values_list('book_id', 'id'):
+        free.setdefault(book_id, copy_id)
+
+    return free
+
+
+@transaction.atomic
+def checkout_book(reader, book_id):
+    """
+    Lend a copy of a book to ``reader``.
+
+    The conditional ``UPDATE ... SET available_copies = available_copies - 1
+    WHERE available_copies > 0`` is the only check: it reserves a copy, and
+    the row lock it takes keeps concurrent checkouts of the same book from
+    picking the same free copy until this one commits.
+    """
+
+    updated = (
+        Book.objects.filter(id=book_id, available_copies__gt=0)
+        .exclude(Exists(_open_loans(book=OuterRef('pk'), reader=reader)))
+        .update(available_copies=F('available_copies') - 1)
+    )
+
+    if not updated:
+
+        if Book.objects.filter(id=book_id).exists():
+
+            raise CirculationError(BOOK_ALREADY_BORROWED)
+
+        raise NotFoundError(BOOK_NOT_FOUND)
+
+    copy_id = _free_copies([book_id]).get(book_id)
+
+    # The count can only be ahead of the free copies after a bulk load without refresh_copy_counts().
+    if copy_id is None:
+
+        raise CirculationError(BOOK_ALREADY_BORROWED)
+
+    # Two checkouts of the same book by the same reader can both pass the UPDATE; the first insert wins.
+    try:
+        borrowing = Borrowing.objects.create(reader=reader, book_id=book_id, copy_id=copy_id)
+    except IntegrityError:
+
+        raise CirculationError(BOOK_ALREADY_BORROWED)
+
+    transaction.on_commit(bump_catalog_version)
+
+    return borrowing
+
+
+def _checkin_error(book_id):
+    copies = Book.objects.filter(id=book_id).values_list('total_copies', 'available_copies').first()
+
+    if copies is None:
+
+        return NotFoundError(BOOK_NOT_FOUND)
+
+    total_copies, available_copies = copies
+
+    if total_copies == available_copies:
+
+        return CirculationError(BOOK_NOT_BORROWED)
+
+    return NotFoundError(BORROWING_NOT_FOUND)
+
+
+def _release_copies(borrowings):
+    # Loans whose copy was deleted in the meantime did not hold one of the available copies.
+    book_ids = [borrowing.book_id for borrowing in borrowings if borrowing.copy_id is not None]
+
+    if book_ids:
+        Book.objects.filter(id__in=book_ids).update(available_copies=F('available_copies') + 1)
+
+
+@transaction.atomic
+def checkin_book(reader, book_id):
+    borrowing = _open_loans(reader=reader, book_id=book_id).select_related('book').first()
+
+    if borrowing is None:
+
+        raise _checkin_error(book_id)
+
+    now = timezone.now()
+    # In the current time zone, like the auto_now_add borrowed_date; a UTC date can fall before it.
+    returned_date = timezone.localdate(now)
+    updated = Borrowing.objects.filter(pk=borrowing.pk, returned_date__isnull=True).update(
+        returned_date=returned_date, updated_at=now
+    )
+
+    if not updated:
+
+        raise _checkin_error(book_id)
+
+    _release_copies([borrowing])
+    transaction.on_commit(bump_catalog_version)
+    borrowing.returned_date = returned_date
+
+    return borrowing
+
+
+def add_copies(book_ids, count=1):
+    """Add ``count`` copies to each of the books, all of them available."""
+
+    Copy.objects.bulk_create(Copy(book_id=book_id) for book_id in book_ids for _ in range(count))
+    Book.objects.filter(id__in=book_ids).update(
+        total_copies=F('total_copies') + count, available_copies=F('available_copies') + count
+    )
+    transaction.on_commit(bump_catalog_version)
+
+
+def refresh_copy_counts(books=None):
+    """
+    Recount the total and available copies of ``books``, a queryset, or of every book.
+
+    For bulk loads and copies removed outside ``add_copies()``; checkouts and
+    returns keep the counts themselves.
+    """
+
+    copies = Copy.objects.filter(book=OuterRef('pk')).order_by().values('book')
+
+    def count(queryset):
+
+        return Coalesce(Subquery(queryset.annotate(count=Count('id')).values('count')), 0)
+
+    (Book.objects.all() if books is None else books).update(
+        total_copies=count(copies),
+        available_copies=count(copies.exclude(Exists(_open_loans(copy=OuterRef('pk'))))),
+    )
+    transaction.on_commit(bump_catalog_version)
+
+
+class BatchResult:
+
+    def __init__(self, book_ids):
+        self.book_ids = list(dict.fromkeys(book_ids))
+        self.borrowings = {}
+        self.errors = {}
+
+    def items(self):
+
+        for book_id in self.book_ids:
+
+            if book_id in self.borrowings:
+
+                yield book_id, self.borrowings[book_id], None
+            else:
+
+                yield book_id, None, self.errors[book_id]
+
+
+def _missing_books(book_ids, found_ids):
+    missing = [book_id for book_id in book_ids if book_id not in found_ids]
+
+    if not missing:
+
+        return set()
+
+    existing = set(Book.objects.filter(id__in=missing).values_list('id', flat=True))
+
+    return {book_id for book_id in missing if book_id not in existing}
+
+
+@transaction.atomic
+def borrow_books(reader, book_ids):
+    """
+    Borrow several books in one transaction.
+
+    Rows locked by a concurrent checkout are skipped and reported as already
+    borrowed instead of waiting for the other transaction to finish.
+    """
+
+    result = BatchResult(book_ids)
+    books = list(
+        Book.objects.select_for_update(skip_locked=True)
+        .filter(id__in=result.book_ids, available_copies__gt=0)
+        .exclude(Exists(_open_loans(book=OuterRef('pk'), reader=reader)))
+        .only('id', 'title')
+    )
+    copies = _free_copies([book.id for book in books]) if books else {}
+    books = [book for book in books if book.id in copies]
+    borrowings = Borrowing.objects.bulk_create(
+        Borrowing(reader=reader, book=book, copy_id=copies[book.id]) for book in books
+    )
+
+    if borrowings:
+        Book.objects.filter(id__in=[book.id for book in books]).update(available_copies=F('available_copies') - 1)
+        transaction.on_commit(bump_catalog_version)
+
+    result.borrowings = {borrowing.book_id: borrowing for borrowing in borrowings}
+    missing = _missing_books(result.book_ids, result.borrowings)
+
+    for book_id in result.book_ids:
+
+        if book_id not in result.borrowings:
+            result.errors[book_id] = BOOK_NOT_FOUND if book_id in missing else BOOK_ALREADY_BORROWED
+
+    return result
+
+
+@transaction.atomic
+def return_books(reader, book_ids):
+    result = BatchResult(book_ids)
+    borrowings = list(
+        Borrowing.objects.select_for_update(skip_locked=True, of=('self',))
+        .select_related('book')
+        .filter(reader=reader, book_id__in=result.book_ids, returned_date__isnull=True)
+    )
+
+    if borrowings:
+        now = timezone.now()
+        returned_date = timezone.localdate(now)
+        Borrowing.objects.filter(id__in=[borrowing.id for borrowing in borrowings]).update(
+            returned_date=returned_date, updated_at=now
+        )
+        _release_copies(borrowings)
+        transaction.on_commit(bump_catalog_version)
+
+        for borrowing in borrowings:
+            borrowing.returned_date = returned_date
+
+    result.borrowings = {borrowing.book_id: borrowing for borrowing in borrowings}
+    missing = _missing_books(result.book_ids, result.borrowings)
+
+    for book_id in result.book_ids:
+
+        if book_id not in result.borrowings:
+            result.errors[book_id] = BOOK_NOT_FOUND if book_id in missing else BORROWING_NOT_FOUND
+
+    return result
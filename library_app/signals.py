@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import user_cache
+from .cache import bump_catalog_version
+from .models import Author, Book, Genre, Reader, User
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_catalog_cache(sender, using, **kwargs):
+    # After the commit, so that concurrent readers cannot cache the old rows under the new version.
+    transaction.on_commit(bump_catalog_version, using=using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Reader)
+@receiver(post_delete, sender=Reader)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Readers share the user's primary key; the cached user may hold its reader in the related-object cache.
+    user_cache.delete(instance.pk)
+
+
+def simulate_db_latency(execute, sql, params, many, context):
+    time.sleep(settings.SIMULATED_DB_LATENCY_MS / 1000)
+
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_simulated_db_latency(sender, connection, **kwargs):
+
+    if settings.SIMULATED_DB_LATENCY_MS and simulate_db_latency not in connection.execute_wrappers:
+        connection.execute_wrappers.append(simulate_db_latency)
@@ -1,15 +1,61 @@
-from django.test import TestCase, Client
+import base64
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.db import connection, connections, models, IntegrityError, transaction
 from django.contrib.auth import get_user_model
 
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import Book, Reader, Borrowing
+from . import metrics
+from .authentication import user_cache
+from .cache import bump_catalog_version
+from .routers import pin_to_primary, replica_reads
+from .models import Author, Book, BookCirculation, Copy, Genre, LoanCirculation, Reader, ReaderCirculation, Borrowing
+from .services import BOOK_ALREADY_BORROWED, CirculationError, checkin_book, checkout_book, refresh_copy_counts
+from .serializers import BorrowingSerializer
+from .urls import urlpatterns
+from .views import READ_PRIMARY_COOKIE
+from .renderers import FastJSONRenderer, FastJSONParser
 
 
 User = get_user_model()
 
+
+def create_book(using='default', copies=1, **fields):
+    """Create a book with ``copies`` copies, looking its author and genre up by name."""
+
+    for field, model in (('author', Author), ('genre', Genre)):
+        fields[field] = model.objects.using(using).get_or_create(name=fields[field])[0]
+
+    fields.setdefault('available_copies', copies)
+    book = Book.objects.using(using).create(total_copies=copies, **fields)
+    Copy.objects.using(using).bulk_create(Copy(book=book) for _ in range(copies))
+
+    return book
+
+
+def forged_cursor(*position):
+
+    return base64.urlsafe_b64encode(json.dumps({'p': list(position), 'r': False}).encode()).decode()
+
+
 """
 Тесты для моделей
 """
@@ -17,13 +63,14 @@ User = get_user_model()
 
 class BookModelTest(TestCase):
     def setUp(self):
-        self.book = Book.objects.create(title="Test Book", author="Test Author", genre="Test Genre")
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
 
     def test_book_creation(self):
         self.assertEqual(self.book.title, "Test Book")
-        self.assertEqual(self.book.author, "Test Author")
-        self.assertEqual(self.book.genre, "Test Genre")
-        self.assertFalse(self.book.is_checked_out)
+        self.assertEqual(self.book.author.name, "Test Author")
+        self.assertEqual(self.book.genre.name, "Test Genre")
+        self.assertEqual((self.book.total_copies, self.book.available_copies), (1, 1))
+        self.assertEqual(self.book.copies.count(), 1)
 
 
 class ReaderModelTest(TestCase):
@@ -42,7 +89,7 @@ class BorrowingModelTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="testuser", password="testpass")
         self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
-        self.book = Book.objects.create(title="Test Book", author="Test Author", genre="Test Genre")
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
         self.borrowing = Borrowing.objects.create(reader=self.reader, book=self.book)
 
     def test_borrowing_creation(self):
@@ -52,6 +99,14 @@ class BorrowingModelTest(TestCase):
         self.assertIsNone(self.borrowing.returned_date)
         self.assertFalse(self.borrowing.is_returned())
 
+    def test_one_open_borrowing_per_book(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Borrowing.objects.create(reader=self.reader, book=self.book)
+
+        self.borrowing.returned_date = self.borrowing.borrowed_date
+        self.borrowing.save()
+        Borrowing.objects.create(reader=self.reader, book=self.book)
+
 """
 Тесты для представлений
 """
@@ -62,7 +117,7 @@ class BookListViewTest(TestCase):
         self.client = APIClient()
         self.user = User.objects.create_user(username="testuser", password="testpass")
         self.client.force_authenticate(user=self.user)
-        self.book = Book.objects.create(title="Test Book", author="Test Author", genre="Test Genre")
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
 
     def test_book_list_view(self):
         response = self.client.get(reverse('api_book_list'))
@@ -70,13 +125,134 @@ class BookListViewTest(TestCase):
         self.assertContains(response, "Test Book")
 
 
+class HomeViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username="testuser", password="testpass", is_reader=True)
+        self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
+        self.client.login(username="testuser", password="testpass")
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
+
+    def count_home_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+
+        return len(context.captured_queries)
+
+    def test_home_marks_borrowed_books(self):
+        other_book = create_book(title="Other Book", author="Other Author", genre="Other Genre")
+        Borrowing.objects.create(reader=self.reader, book=self.book)
+        response = self.client.get(reverse('home'))
+        books = {book.pk: book for book in response.context['books']}
+        self.assertTrue(books[self.book.pk].is_borrowed)
+        self.assertFalse(books[other_book.pk].is_borrowed)
+
+    def test_home_query_count_does_not_grow_with_catalog(self):
+        Borrowing.objects.create(reader=self.reader, book=self.book)
+        baseline = self.count_home_queries()
+        author, genre = Author.objects.create(name="Author"), Genre.objects.create(name="Genre")
+        Book.objects.bulk_create(Book(title=f"Book {i}", author=author, genre=genre) for i in range(20))
+        self.assertEqual(self.count_home_queries(), baseline)
+
+    def test_borrow_and_return_book(self):
+        self.client.get(reverse('borrow_book', args=[self.book.id]))
+        self.client.get(reverse('borrow_book', args=[self.book.id]))
+        self.assertEqual(Borrowing.objects.filter(book=self.book, returned_date__isnull=True).count(), 1)
+
+        self.client.get(reverse('return_book', args=[self.book.id]))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+        self.assertFalse(Borrowing.objects.filter(book=self.book, returned_date__isnull=True).exists())
+
+    def test_home_anonymous(self):
+        self.client.logout()
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['books'][0].is_borrowed)
+
+
+class LibrarianDashboardTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        User.objects.create_user(username="librarian", password="testpass", is_librarian=True)
+        self.client.login(username="librarian", password="testpass")
+        self.user = User.objects.create_user(username="testuser", password="testpass", is_reader=True)
+        self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
+
+    def borrow(self, title, days_ago):
+        book = create_book(title=title, author="Test Author", genre="Test Genre")
+        borrowing = Borrowing.objects.create(reader=self.reader, book=book)
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            borrowed_date=timezone.localdate() - timedelta(days=days_ago)
+        )
+
+    def test_dashboard_computes_days_overdue_in_sql(self):
+        self.borrow("Recent Book", 3)
+        self.borrow("Old Book", 40)
+        response = self.client.get(reverse('librarian_dashboard'))
+        rows = [(borrowing.book.title, borrowing.days_overdue) for borrowing in response.context['overdue_borrowings']]
+        self.assertEqual(rows, [("Old Book", 40), ("Recent Book", 3)])
+
+        response = self.client.get(reverse('librarian_dashboard'), {'min_days': 30})
+        self.assertContains(response, "Old Book")
+        self.assertNotContains(response, "Recent Book")
+
+    def test_dashboard_min_days_out_of_range(self):
+        self.borrow("Old Book", 40)
+        response = self.client.get(reverse('librarian_dashboard'), {'min_days': 99999999999})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Old Book")
+
+    def test_dashboard_forged_cursor(self):
+        for live in (0, 1):
+            response = self.client.get(reverse('librarian_dashboard'),
+                                       {'live': live, 'cursor': forged_cursor("2024-13-45", 1)})
+            self.assertEqual(response.status_code, 404)
+
+    def test_dashboard_pagination(self):
+        for i in range(3):
+            self.borrow(f"Book {i}", 10 - i)
+        response = self.client.get(reverse('librarian_dashboard'), {'page_size': 2})
+        self.assertNotContains(response, "Book 2")
+        response = self.client.get(response.context['paginator'].get_next_link())
+        self.assertEqual([borrowing.book.title for borrowing in response.context['overdue_borrowings']], ["Book 2"])
+
+    def test_dashboard_query_count_does_not_grow_with_loans(self):
+        self.borrow("Book 0", 1)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('librarian_dashboard'))
+        for i in range(1, 10):
+            self.borrow(f"Book {i}", i)
+        with self.assertNumQueries(len(context.captured_queries)):
+            response = self.client.get(reverse('librarian_dashboard'))
+        self.assertContains(response, "Book 9")
+
+    def test_dashboard_reads_snapshot_unless_live(self):
+        self.borrow("Old Book", 40)
+        self.borrow("Recent Book", 3)
+        call_command('refresh_circulation_snapshot', stdout=StringIO())
+        self.borrow("New Book", 5)
+
+        response = self.client.get(reverse('librarian_dashboard'))
+        self.assertFalse(response.context['live'])
+        self.assertEqual([borrowing.book.title for borrowing in response.context['overdue_borrowings']],
+                         ["Old Book", "Recent Book"])
+        self.assertEqual([(reader.open_loans, reader.max_days_overdue) for reader in response.context['overdue_readers']],
+                         [(2, 40)])
+
+        response = self.client.get(reverse('librarian_dashboard'), {'live': 1})
+        self.assertContains(response, "New Book")
+        self.assertEqual([reader.open_loans for reader in response.context['overdue_readers']], [3])
+
+
 class BorrowBookViewTest(TestCase):
     def setUp(self):
         self.client = APIClient()
         self.user = User.objects.create_user(username="testuser", password="testpass")
         self.client.force_authenticate(user=self.user)
         self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
-        self.book = Book.objects.create(title="Test Book", author="Test Author", genre="Test Genre")
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
 
     def test_borrow_book_view(self):
         response = self.client.post(reverse('api_borrow_book', args=[self.book.id]))
@@ -93,13 +269,211 @@ class BookAPITest(APITestCase):
         self.client = APIClient()
         self.user = User.objects.create_user(username="testuser", password="testpass")
         self.client.force_authenticate(user=self.user)
-        self.book = Book.objects.create(title="Test Book", author="Test Author", genre="Test Genre")
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
 
     def test_book_list_api(self):
         response = self.client.get(reverse('api_book_list'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertContains(response, "Test Book")
 
+    def test_book_list_api_keyset_pagination(self):
+        Book.objects.bulk_create(
+            Book(title=title, author=self.book.author, genre=self.book.genre) for title in ["A", "B", "B", "C"]
+        )
+        expected = list(Book.objects.order_by('title', 'id').values_list('id', flat=True))
+
+        seen = []
+        url = reverse('api_book_list') + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(book['id'] for book in response.data['results'])
+            last_page = response.data
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(last_page['previous'])
+        self.assertEqual([book['id'] for book in response.data['results']], expected[2:4])
+
+    def test_book_list_api_invalid_cursor(self):
+        response = self.client.get(reverse('api_book_list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_forged_cursor_positions(self):
+        self.client.force_login(self.user)
+        for position in [("a", "x"), ("a", None), ("a", 2 ** 63), (["a"], {})]:
+            for url in (reverse('api_book_list'), reverse('home')):
+                response = self.client.get(url, {'cursor': forged_cursor(*position)})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(reverse('api_book_list'), {'cursor': forged_cursor("A", "1")})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class BookListCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.force_authenticate(user=self.user)
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
+
+    def test_conditional_request_returns_304_without_queries(self):
+        response = self.client.get(reverse('api_book_list'))
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('api_book_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_cached_response_served_without_queries(self):
+        self.client.get(reverse('api_book_list'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('api_book_list'))
+        self.assertContains(response, "Test Book")
+
+    def test_book_changes_invalidate_cache(self):
+        etag = self.client.get(reverse('api_book_list'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            create_book(title="New Book", author="New Author", genre="New Genre")
+
+        response = self.client.get(reverse('api_book_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, "New Book")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.delete()
+        response = self.client.get(reverse('api_book_list'))
+        self.assertNotContains(response, "Test Book")
+
+    def test_catalog_version_bumped_on_commit(self):
+        etag = self.client.get(reverse('api_book_list'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.book.title = "Renamed Book"
+            self.book.save()
+            # Until the commit the old version, and the pages cached under it, stay current.
+            response = self.client.get(reverse('api_book_list'), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn(bump_catalog_version, callbacks)
+
+        response = self.client.get(reverse('api_book_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Renamed Book")
+
+
+class BookFilterAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.force_authenticate(user=self.user)
+        self.dune = create_book(title="Dune", author="Frank Herbert", genre="Science Fiction")
+        self.messiah = create_book(title="Dune Messiah", author="Frank Herbert", genre="Science Fiction",
+                                   available_copies=0)
+        self.emma = create_book(title="Emma", author="Jane Austen", genre="Romance")
+        self.herbert, self.fiction = self.dune.author_id, self.dune.genre_id
+        self.austen, self.romance = self.emma.author_id, self.emma.genre_id
+
+    def titles(self, **params):
+        response = self.client.get(reverse('api_book_list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        return [book['title'] for book in response.data['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.titles(genre=self.romance), ["Emma"])
+        self.assertEqual(self.titles(genre=f"{self.romance},{self.fiction}"), ["Dune", "Dune Messiah", "Emma"])
+        self.assertEqual(self.titles(author=self.herbert, available="true"), ["Dune"])
+        self.assertEqual(self.titles(available="false"), ["Dune Messiah"])
+        self.assertEqual(self.titles(author=self.austen, genre=self.fiction), [])
+
+    def test_filters_are_kept_by_page_links(self):
+        response = self.client.get(reverse('api_book_list'), {'author': self.herbert, 'page_size': 1})
+        response = self.client.get(response.data['next'])
+        self.assertEqual([book['title'] for book in response.data['results']], ["Dune Messiah"])
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_filters(self):
+        for params in [{'genre': "fiction"}, {'available': "maybe"}, {'facets': "genre,title"}]:
+            response = self.client.get(reverse('api_book_list'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(list(params)[0], response.data)
+
+    def test_out_of_range_ids(self):
+        for params in [{'genre': "99999999999999999999999"}, {'author': f"1,{2 ** 63}"}, {'genre': "0"}, {'author': "-1"}]:
+            response = self.client.get(reverse('api_book_list'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data, {list(params)[0]: "Expected comma-separated ids."})
+
+        response = self.client.get(reverse('api_book_list'), {'genre': str(2 ** 63 - 1)})
+        self.assertEqual(response.data['results'], [])
+
+    def test_facets_ignore_their_own_filter(self):
+        response = self.client.get(reverse('api_book_list'), {'genre': self.fiction, 'available': "true",
+                                                              'facets': "genre,author,available"})
+        self.assertEqual([book['title'] for book in response.data['results']], ["Dune"])
+        self.assertEqual(response.data['facets'], {
+            'genre': [{'id': self.romance, 'name': "Romance", 'count': 1},
+                      {'id': self.fiction, 'name': "Science Fiction", 'count': 1}],
+            'author': [{'id': self.herbert, 'name': "Frank Herbert", 'count': 1}],
+            'available': [{'value': True, 'count': 1}, {'value': False, 'count': 1}],
+        })
+
+    def test_facets_are_one_query_and_shared_by_pages(self):
+        params = {'author': self.herbert, 'page_size': 1, 'facets': "genre,available"}
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api_book_list'), params)
+        self.assertEqual(response.data['facets']['available'], [{'value': True, 'count': 1}, {'value': False, 'count': 1}])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['facets']['genre'], [{'id': self.fiction, 'name': "Science Fiction", 'count': 2}])
+
+        self.assertNotIn('facets', self.client.get(reverse('api_book_list')).data)
+
+
+class BookSearchAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.force_authenticate(user=self.user)
+        self.dune = create_book(title="Dune", author="Frank Herbert", genre="Science Fiction")
+        self.emma = create_book(title="Emma", author="Jane Austen", genre="Romance")
+
+    def test_search_matches_title_author_and_genre(self):
+        for query in ["dune", "herbert", "science", "scien"]:
+            response = self.client.get(reverse('api_book_search'), {'q': query})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([book['id'] for book in response.data['results']], [self.dune.id])
+
+    def test_search_index_follows_updates(self):
+        self.emma.title = "Persuasion"
+        self.emma.save()
+        response = self.client.get(reverse('api_book_search'), {'q': "persuasion"})
+        self.assertEqual(response.data['count'], 1)
+        self.emma.delete()
+        response = self.client.get(reverse('api_book_search'), {'q': "persuasion"})
+        self.assertEqual(response.data['count'], 0)
+
+    def test_search_index_follows_author_and_genre_renames(self):
+        Author.objects.filter(pk=self.emma.author_id).update(name="Anne Bronte")
+        Genre.objects.filter(pk=self.emma.genre_id).update(name="Gothic")
+
+        for query in ["bronte", "gothic"]:
+            response = self.client.get(reverse('api_book_search'), {'q': query})
+            self.assertEqual([book['id'] for book in response.data['results']], [self.emma.id])
+            self.assertEqual(response.data['results'][0]['author'], "Anne Bronte")
+
+        response = self.client.get(reverse('api_book_search'), {'q': "austen"})
+        self.assertEqual(response.data['count'], 0)
+
+    def test_search_requires_query(self):
+        response = self.client.get(reverse('api_book_search'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class BorrowBookAPITest(APITestCase):
     def setUp(self):
@@ -107,13 +481,774 @@ class BorrowBookAPITest(APITestCase):
         self.user = User.objects.create_user(username="testuser", password="testpass")
         self.client.force_authenticate(user=self.user)
         self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
-        self.book = Book.objects.create(title="Test Book", author="Test Author", genre="Test Genre")
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
 
     def test_borrow_book_api(self):
         response = self.client.post(reverse('api_borrow_book', args=[self.book.id]))
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(Borrowing.objects.filter(reader=self.reader, book=self.book).exists())
 
+    def test_borrow_book_twice_api(self):
+        self.client.post(reverse('api_borrow_book', args=[self.book.id]))
+        response = self.client.post(reverse('api_borrow_book', args=[self.book.id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Borrowing.objects.filter(book=self.book).count(), 1)
+
+    def test_borrow_missing_book_api(self):
+        response = self.client.post(reverse('api_borrow_book', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_return_book_api(self):
+        response = self.client.post(reverse('api_return_book', args=[self.book.id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.post(reverse('api_borrow_book', args=[self.book.id]))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual(Borrowing.objects.get(book=self.book).copy, self.book.copies.get())
+
+        response = self.client.post(reverse('api_return_book', args=[self.book.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data['borrowed_date'])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+        self.assertFalse(Borrowing.objects.filter(book=self.book, returned_date__isnull=True).exists())
+
+
+class MyBooksAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.force_authenticate(user=self.user)
+        self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
+
+    def borrow(self, count):
+        for _ in range(count):
+            book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
+            Borrowing.objects.create(reader=self.reader, book=book)
+
+    def test_my_books_matches_model_serializer(self):
+        self.borrow(2)
+        Borrowing.objects.update(borrowed_date=timezone.localdate() - timedelta(days=5))
+        response = self.client.get(reverse('api_my_books'))
+        borrowings = Borrowing.objects.order_by('borrowed_date', 'id')
+        self.assertEqual(json.loads(response.content), json.loads(json.dumps(
+            BorrowingSerializer(borrowings, many=True).data
+        )))
+        self.assertEqual(response.data[0]['days_borrowed'], 5)
+
+    def test_my_books_query_count_does_not_grow(self):
+        self.borrow(1)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('api_my_books'))
+        self.borrow(5)
+        with self.assertNumQueries(len(context.captured_queries)):
+            response = self.client.get(reverse('api_my_books'))
+        self.assertEqual(len(response.data), 6)
+
+
+class TokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="testuser", password="testpass", is_reader=True)
+        self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
+        self.login("testuser")
+
+    def login(self, username):
+        response = self.client.post(reverse('token_obtain_pair'), {'username': username, 'password': "testpass"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+        return AccessToken(response.data['access'])
+
+    def test_token_carries_claims(self):
+        token = self.login("testuser")
+        self.assertEqual(token['reader_id'], self.reader.pk)
+        self.assertTrue(token['is_reader'])
+        self.assertFalse(token['is_librarian'])
+
+    def test_cached_user_and_reader_claim_skip_queries(self):
+        self.client.get(reverse('api_my_books'))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api_my_books'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('api_borrow_book', args=[self.book.id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Borrowing.objects.filter(reader=self.reader, book=self.book).exists())
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('api_my_books')).status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('api_my_books')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_reader_claim_is_not_trusted(self):
+        self.assertEqual(self.client.get(reverse('api_my_books')).status_code, status.HTTP_200_OK)
+        self.reader.delete()
+        response = self.client.post(reverse('api_borrow_book', args=[self.book.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['error'], "Reader not found")
+        self.assertFalse(Borrowing.objects.exists())
+
+    def test_user_without_reader_profile(self):
+        User.objects.create_user(username="librarian", password="testpass", is_librarian=True)
+        self.login("librarian")
+        response = self.client.post(reverse('api_borrow_book', args=[self.book.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['error'], "Reader not found")
+
+
+class ReaderProfileQueryCountTest(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpass", is_reader=True)
+        self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
+        self.session = Client()
+        self.session.force_login(self.user)
+        self.client = APIClient()
+        response = self.client.post(reverse('token_obtain_pair'), {'username': "testuser", 'password': "testpass"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        # Warm the authenticated user cache.
+        self.client.get(reverse('api_my_books'))
+
+    def assertReaderNotQueried(self, context):
+        self.assertFalse([query['sql'] for query in context.captured_queries
+                          if 'FROM "library_app_reader"' in query['sql']])
+
+    def test_my_books_view(self):
+        # Session, user joined with its reader, borrowings.
+        with self.assertNumQueries(3) as context:
+            response = self.session.get(reverse('my_books'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertReaderNotQueried(context)
+
+    def test_borrow_and_return_views(self):
+        # Session, user joined with its reader, then the service queries inside a savepoint.
+        with self.assertNumQueries(7) as context:
+            self.session.get(reverse('borrow_book', args=[self.book.id]))
+        self.assertReaderNotQueried(context)
+        self.assertTrue(Borrowing.objects.filter(reader=self.reader, book=self.book).exists())
+
+        with self.assertNumQueries(7) as context:
+            self.session.get(reverse('return_book', args=[self.book.id]))
+        self.assertReaderNotQueried(context)
+        self.assertFalse(Borrowing.objects.filter(book=self.book, returned_date__isnull=True).exists())
+
+    def test_my_books_api(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api_my_books'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_borrow_and_return_api(self):
+        # Savepoint, counter update, free copy, insert, release, book title for the response.
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('api_borrow_book', args=[self.book.id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(5):
+            response = self.client.post(reverse('api_return_book', args=[self.book.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_without_reader_profile(self):
+        user = User.objects.create_user(username="librarian", password="testpass", is_librarian=True)
+        self.session.force_login(user)
+        response = self.session.get(reverse('my_books'))
+        self.assertRedirects(response, reverse('home'))
+
+    def test_session_from_model_backend_stays_logged_in(self):
+        session = Client()
+        session.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = session.get(reverse('my_books'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.context['user'], self.user)
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testpass", is_reader=True)
+        self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
+        Borrowing.objects.create(reader=self.reader, book=self.book)
+        self.headers = {'Authorization': f"Bearer {AccessToken.for_user(self.user)}"}
+
+    async def test_book_list_async(self):
+        response = await self.async_client.get(reverse('api_book_list_async'), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['title'], "Test Book")
+
+        response = await self.async_client.get(reverse('api_book_list_async'),
+                                               headers={**self.headers, 'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_book_list_async_reads_catalog_version_without_blocking(self):
+        with mock.patch('library_app.cache.get_catalog_version', side_effect=AssertionError("blocking lookup")):
+            response = await self.async_client.get(reverse('api_book_list_async'), {'facets': "genre"},
+                                                   headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            response = await self.async_client.get(reverse('api_book_list_async'), {'facets': "genre"},
+                                                   headers={**self.headers, 'If-None-Match': response['ETag']})
+            self.assertEqual(response.status_code, 304)
+
+    async def test_book_list_async_filters_and_facets(self):
+        params = {'genre': self.book.genre_id, 'facets': "genre"}
+        response = await self.async_client.get(reverse('api_book_list_async'), params, headers=self.headers)
+        self.assertEqual(response.json()['facets']['genre'], [{'id': self.book.genre_id, 'name': "Test Genre", 'count': 1}])
+
+        response = await self.async_client.get(reverse('api_book_list_async'), {'genre': "x"}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    async def test_book_list_async_forged_cursor(self):
+        response = await self.async_client.get(reverse('api_book_list_async'), {'cursor': forged_cursor("a", "x")},
+                                               headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_my_books_async(self):
+        response = await self.async_client.get(reverse('api_my_books_async'), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['book_title'], "Test Book")
+
+    async def test_async_api_requires_token(self):
+        response = await self.async_client.get(reverse('api_my_books_async'))
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(reverse('api_my_books_async'), headers={'Authorization': "Bearer invalid"})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_home_async(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('home_async'))
+        self.assertContains(response, "Return")
+
+
+class BookCopiesTest(TestCase):
+    def setUp(self):
+        self.readers = []
+
+        for i in range(3):
+            user = User.objects.create_user(username=f"reader{i}", password="testpass", is_reader=True)
+            self.readers.append(Reader.objects.create(user=user, first_name="Test", last_name="Reader",
+                                                      address="Test Address"))
+
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre", copies=2)
+
+    def available_copies(self):
+        self.book.refresh_from_db()
+
+        return self.book.available_copies
+
+    def test_each_reader_gets_a_free_copy(self):
+        first = checkout_book(self.readers[0], self.book.id)
+        self.assertEqual(self.available_copies(), 1)
+
+        with self.assertRaisesMessage(CirculationError, BOOK_ALREADY_BORROWED):
+            checkout_book(self.readers[0], self.book.id)
+
+        second = checkout_book(self.readers[1], self.book.id)
+        self.assertNotEqual(first.copy_id, second.copy_id)
+        self.assertEqual(self.available_copies(), 0)
+
+        with self.assertRaisesMessage(CirculationError, BOOK_ALREADY_BORROWED):
+            checkout_book(self.readers[2], self.book.id)
+
+        checkin_book(self.readers[0], self.book.id)
+        self.assertEqual(self.available_copies(), 1)
+        self.assertEqual(checkout_book(self.readers[2], self.book.id).copy_id, first.copy_id)
+
+    def test_returning_a_deleted_copy(self):
+        checkout_book(self.readers[0], self.book.id).copy.delete()
+        refresh_copy_counts()
+        self.assertEqual(self.available_copies(), 1)
+        self.assertEqual(self.book.total_copies, 1)
+
+        checkin_book(self.readers[0], self.book.id)
+        self.assertEqual(self.available_copies(), 1)
+
+    def test_refresh_copy_counts(self):
+        checkout_book(self.readers[0], self.book.id)
+        Book.objects.update(total_copies=5, available_copies=5)
+        refresh_copy_counts(Book.objects.filter(id=self.book.id))
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.total_copies, self.book.available_copies), (2, 1))
+
+
+class BatchCirculationAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.client.force_authenticate(user=self.user)
+        self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
+        self.books = [
+            create_book(title=f"Test Book {i}", author="Test Author", genre="Test Genre") for i in range(3)
+        ]
+
+    def test_batch_borrow_and_return(self):
+        Book.objects.filter(id=self.books[2].id).update(available_copies=0)
+        book_ids = [book.id for book in self.books] + [0]
+
+        response = self.client.post(reverse('api_borrow_batch'), {'book_ids': book_ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([item['success'] for item in results], [True, True, False, False])
+        self.assertEqual(results[0]['borrowing']['book_title'], "Test Book 0")
+        self.assertEqual(results[2]['error'], "Book is already borrowed")
+        self.assertEqual(results[3]['error'], "Book not found")
+        self.assertEqual(Book.objects.filter(available_copies=0).count(), 3)
+        self.assertEqual(
+            set(Borrowing.objects.values_list('copy__book_id', flat=True)),
+            set(book_ids[:2]),
+        )
+
+        response = self.client.post(reverse('api_return_batch'), {'book_ids': book_ids}, format='json')
+        results = response.data['results']
+        self.assertEqual([item['success'] for item in results], [True, True, False, False])
+        self.assertEqual(results[2]['error'], "Borrowing record not found")
+        self.assertFalse(Borrowing.objects.filter(returned_date__isnull=True).exists())
+        self.assertEqual(list(Book.objects.filter(available_copies=0)), [self.books[2]])
+
+    def test_batch_borrow_query_count_is_constant(self):
+        book_ids = [book.id for book in self.books]
+
+        # Savepoint, books, free copies, insert, counter update, release.
+        with self.assertNumQueries(6):
+            self.client.post(reverse('api_borrow_batch'), {'book_ids': book_ids}, format='json')
+
+    def test_batch_requires_book_ids(self):
+        response = self.client.post(reverse('api_borrow_batch'), {'book_ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTest(TransactionTestCase):
+    """A second SQLite database stands in for the replica; it is not replicated, so reads show where they went."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Registered after the test case has guarded its databases, so queries may reach it.
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = connections.configure_settings({
+            'default': connections.settings['default'],
+            'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': f"{cls.replica_dir.name}/replica.sqlite3"},
+        })['replica']
+        call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def tearDown(self):
+        Borrowing.objects.using('replica').all().delete()
+        Book.objects.using('replica').all().delete()
+        Author.objects.using('replica').all().delete()
+        Genre.objects.using('replica').all().delete()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="testuser", password="testpass", is_reader=True)
+        self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
+        self.client.force_authenticate(user=self.user)
+        self.book = create_book(title="Primary Book", author="Test Author", genre="Test Genre")
+        create_book(using='replica', title="Replica Book", author="Test Author", genre="Test Genre")
+
+    def test_exports_read_from_replica(self):
+        response = self.client.get(reverse('api_export_books'), {'format': 'csv'})
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn("Replica Book", content)
+        self.assertNotIn("Primary Book", content)
+
+    def test_cached_catalog_reads_from_primary(self):
+        response = self.client.get(reverse('api_book_list'), {'facets': "available"})
+        self.assertEqual([book['title'] for book in response.data['results']], ["Primary Book"])
+        self.assertEqual(response.data['facets']['available'], [{'value': True, 'count': 1}])
+
+    def test_home_reads_from_primary_after_borrowing(self):
+        session = Client()
+        session.force_login(self.user)
+        self.assertContains(session.get(reverse('home')), "Replica Book")
+
+        response = session.get(reverse('borrow_book', args=[self.book.id]))
+        self.assertIn(READ_PRIMARY_COOKIE, response.cookies)
+        response = session.get(reverse('home'))
+        self.assertContains(response, "Primary Book")
+        self.assertEqual(response.cookies[READ_PRIMARY_COOKIE]['max-age'], 0)
+
+        self.assertContains(session.get(reverse('home')), "Replica Book")
+
+    def test_reads_outside_replica_reads_use_primary(self):
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ["Primary Book"])
+
+        with replica_reads():
+            self.assertTrue(User.objects.filter(username="testuser").exists())
+            self.assertEqual(list(Book.objects.values_list('title', flat=True)), ["Replica Book"])
+
+    def test_read_after_write_stays_on_primary(self):
+        with replica_reads():
+            self.assertEqual(Book.objects.count(), 1)
+            book = create_book(title="New Book", author="Test Author", genre="Test Genre")
+            self.assertTrue(Book.objects.filter(pk=book.pk).exists())
+
+        with replica_reads():
+            self.assertFalse(Book.objects.filter(pk=book.pk).exists())
+
+    def test_pin_to_primary(self):
+        with replica_reads(), pin_to_primary():
+            self.assertEqual(list(Book.objects.values_list('title', flat=True)), ["Primary Book"])
+
+        response = self.client.post(reverse('api_borrow_book', args=[self.book.id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Borrowing.objects.using('replica').count(), 0)
+
+
+class ExportAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="librarian", password="testpass", is_librarian=True)
+        self.client.force_authenticate(user=self.user)
+        self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
+        self.book = create_book(title="Test, Book", author="Test Author", genre="Test Genre")
+        self.borrowing = Borrowing.objects.create(reader=self.reader, book=self.book)
+
+    def read(self, response):
+
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_books_csv(self):
+        response = self.client.get(reverse('api_export_books'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        lines = self.read(response).splitlines()
+        self.assertEqual(lines[0], "id,title,author,genre,total_copies,available_copies")
+        self.assertEqual(lines[1], f'{self.book.id},"Test, Book",Test Author,Test Genre,1,1')
+
+    def test_export_borrowings_ndjson(self):
+        response = self.client.get(reverse('api_export_borrowings'), {'format': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['book_title'], "Test, Book")
+        self.assertEqual(rows[0]['reader_username'], "librarian")
+        self.assertEqual(rows[0]['borrowed_date'], self.borrowing.borrowed_date.isoformat())
+
+    def test_export_borrowings_date_range(self):
+        tomorrow = self.borrowing.borrowed_date + timedelta(days=1)
+        response = self.client.get(reverse('api_export_borrowings'), {'format': 'ndjson', 'date_from': tomorrow})
+        self.assertEqual(self.read(response), "")
+
+        response = self.client.get(reverse('api_export_borrowings'), {'date_to': "not-a-date"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response['Content-Type'], "application/json")
+        self.assertEqual(json.loads(response.content), {'date_to': "Expected a date in YYYY-MM-DD format."})
+
+    def test_export_borrowings_librarians_only(self):
+        self.client.force_authenticate(user=User.objects.create_user(username="reader", password="testpass"))
+        response = self.client.get(reverse('api_export_borrowings'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class StatsAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.librarian = User.objects.create_user(username="librarian", password="testpass", is_librarian=True)
+        self.client.force_authenticate(user=self.librarian)
+        self.user = User.objects.create_user(username="testuser", password="testpass", is_reader=True)
+        self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
+        self.today = timezone.localdate()
+        self.popular = create_book(title="Popular", author="Test Author", genre="Fiction")
+        self.other = create_book(title="Other", author="Test Author", genre="History")
+
+    def loan(self, book, borrowed_days_ago, returned_days_ago=None):
+        borrowing = Borrowing.objects.create(reader=self.reader, book=book)
+        returned_date = None if returned_days_ago is None else self.today - timedelta(days=returned_days_ago)
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            borrowed_date=self.today - timedelta(days=borrowed_days_ago), returned_date=returned_date
+        )
+
+    def refresh(self):
+        call_command('refresh_circulation_snapshot', stdout=StringIO())
+
+    def test_stats_from_rollups(self):
+        self.loan(self.popular, 10, 6)
+        self.loan(self.popular, 5, 3)
+        self.loan(self.other, 5, 1)
+        self.loan(self.popular, 40, 35)
+        self.refresh()
+
+        response = self.client.get(reverse('api_stats'), {'top': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['most_borrowed'],
+                         [{'book_id': self.popular.id, 'title': "Popular", 'author': "Test Author", 'loans': 2}])
+        day = self.today - timedelta(days=5)
+        self.assertEqual(response.data['loans_per_genre'], [
+            {'day': self.today - timedelta(days=10), 'genre': "Fiction", 'loans': 1},
+            {'day': day, 'genre': "Fiction", 'loans': 1},
+            {'day': day, 'genre': "History", 'loans': 1},
+        ])
+        self.assertEqual(response.data['average_loan_days'], 3.33)
+
+        response = self.client.get(reverse('api_stats'), {'date_from': self.today - timedelta(days=60)})
+        self.assertEqual(response.data['most_borrowed'][0]['loans'], 3)
+        self.assertEqual(response.data['average_loan_days'], 3.75)
+
+    def test_refresh_picks_up_new_loans(self):
+        self.refresh()
+        checkout_book(self.reader, self.other.id)
+        self.assertEqual(self.client.get(reverse('api_stats')).data['most_borrowed'], [])
+        self.refresh()
+        checkin_book(self.reader, self.other.id)
+        self.refresh()
+        response = self.client.get(reverse('api_stats'))
+        self.assertEqual([book['title'] for book in response.data['most_borrowed']], ["Other"])
+        self.assertEqual(response.data['average_loan_days'], 0.0)
+
+    def test_invalid_parameters(self):
+        for params in ({'top': 0}, {'top': "x"}, {'date_from': "yesterday"},
+                       {'date_from': self.today, 'date_to': self.today - timedelta(days=1)}):
+            self.assertEqual(self.client.get(reverse('api_stats'), params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_librarians_only(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(reverse('api_stats')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MetricsTest(APITestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.client = APIClient()
+        self.staff = User.objects.create_user(username="staff", password="testpass", is_staff=True)
+        self.user = User.objects.create_user(username="testuser", password="testpass", is_reader=True)
+        create_book(title="Test Book", author="Test Author", genre="Test Genre")
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_records_requests_per_route(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(reverse('api_book_list'))
+        self.client.get('/no-such-page/')
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        self.assertIn('library_http_requests_total{route="api_book_list",method="GET",status="200"} 1', text)
+        self.assertIn('library_http_requests_total{route="unmatched",method="GET",status="404"} 1', text)
+        self.assertIn('library_http_request_duration_seconds_count{route="api_book_list"} 1', text)
+        self.assertIn('library_http_request_duration_seconds_bucket{route="api_book_list",le="+Inf"} 1', text)
+        queries = next(line for line in text.splitlines()
+                       if line.startswith('library_db_queries_total{route="api_book_list"}'))
+        self.assertGreater(float(queries.split()[-1]), 0)
+
+    def test_sums_process_files(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            self.client.force_authenticate(user=self.user)
+            self.client.get(reverse('api_book_list'))
+            other = metrics.new_route()
+            other['requests']['GET 200'] = 2
+            other['buckets'][0] = 2
+            pool = {'size': 4, 'available': 3, 'checked_out': 1, 'waiting': 0, 'requests': 7, 'wait_ms': 0,
+                    'timeouts': 0, 'connections_opened': 4, 'connections_lost': 0}
+            # A worker that has exited: its counters are kept, its pool gauges are not.
+            with open(f'{directory}/999999999-1.json', 'w') as file:
+                json.dump({'pid': 999999999, 'routes': {'api_book_list': other}, 'pool': {'default': pool}}, file)
+
+            self.client.force_authenticate(user=self.staff)
+            text = self.client.get(reverse('metrics')).content.decode()
+
+        self.assertIn('library_http_requests_total{route="api_book_list",method="GET",status="200"} 3', text)
+        self.assertIn('library_db_pool_requests_total{alias="default"} 7', text)
+        self.assertNotIn('library_db_pool_size{alias="default"}', text)
+
+
+class FastJSONTest(TestCase):
+    def test_renderer_matches_stdlib_renderer(self):
+        data = {
+            'title': "Line\u2028separator",
+            'borrowed_date': timezone.localdate(),
+            'price': Decimal('9.50'),
+            'tags': ["a", "б"],
+        }
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        self.assertIn(b'\\u2028', FastJSONRenderer().render(data))
+
+    def test_parser(self):
+        parser = FastJSONParser()
+        self.assertEqual(parser.parse(BytesIO('{"book_ids": [1, 2], "q": "ё"}'.encode())),
+                         {'book_ids': [1, 2], 'q': "ё"})
+        with self.assertRaises(ParseError):
+            parser.parse(BytesIO(b'{"book_ids": '))
+
+
+"""
+Тесты для команд управления
+"""
+
+
+class ImportBooksCommandTest(TestCase):
+    def import_books(self, content, suffix='.csv', **options):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, encoding='utf-8') as source:
+            source.write(content)
+            source.flush()
+            call_command('import_books', source.name, stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_import_csv_with_history(self):
+        create_book(title="Emma", author="Jane Austen", genre="Romance")
+        self.import_books(
+            "title,author,genre\nDune,Frank Herbert,SF\nEmma,Jane Austen,Classic\n,Nobody,Nothing\n", batch_size=1
+        )
+        self.assertEqual(Book.objects.get(title="Emma").genre.name, "Romance")
+        self.assertEqual(Book.objects.get(title="Dune").history.get().history_type, '+')
+        self.assertFalse(Book.objects.filter(author__name="Nobody").exists())
+
+    def test_import_reuses_authors_and_genres(self):
+        create_book(title="Emma", author="Jane Austen", genre="Classic")
+        self.import_books("title,author,genre\nPersuasion,Jane Austen,Classic\nDune,Frank Herbert,SF\n"
+                          "Children of Dune,Frank Herbert,SF\n")
+        self.assertEqual(sorted(Author.objects.values_list('name', flat=True)), ["Frank Herbert", "Jane Austen"])
+        self.assertEqual(sorted(Genre.objects.values_list('name', flat=True)), ["Classic", "SF"])
+        self.assertEqual(Author.objects.get(name="Frank Herbert").books.count(), 2)
+
+    def test_import_jsonl_upsert(self):
+        emma = create_book(title="Emma", author="Jane Austen", genre="Romance")
+        self.import_books('{"title": "Emma", "author": "Jane Austen", "genre": "Classic"}\n', suffix='.jsonl',
+                          on_duplicate='update')
+        emma.refresh_from_db()
+        self.assertEqual(emma.genre.name, "Classic")
+        self.assertEqual(emma.history.count(), 2)
+
+    def test_import_copies(self):
+        self.import_books("title,author,genre,copies\nDune,Frank Herbert,SF,3\nEmma,Jane Austen,Classic,\n"
+                          "Ulysses,James Joyce,Classic,0\n")
+        self.assertEqual(dict(Book.objects.values_list('title', 'available_copies')), {"Dune": 3, "Emma": 1})
+        self.assertEqual(Copy.objects.filter(book__title="Dune").count(), 3)
+
+    def test_import_dry_run(self):
+        self.import_books("title,author,genre\nDune,Frank Herbert,SF\n", dry_run=True)
+        self.assertFalse(Book.objects.exists())
+
+
+class RefreshCirculationSnapshotCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testpass", is_reader=True)
+        self.reader = Reader.objects.create(user=self.user, first_name="Test", last_name="Reader", address="Test Address")
+        self.books = [create_book(title=f"Book {i}", author="Test Author", genre="Test Genre") for i in range(3)]
+
+    def refresh(self, *args):
+        call_command('refresh_circulation_snapshot', *args, stdout=StringIO())
+
+    def test_incremental_refresh(self):
+        checkout_book(self.reader, self.books[0].id)
+        checkout_book(self.reader, self.books[1].id)
+        self.refresh()
+        self.assertEqual(ReaderCirculation.objects.get(reader=self.reader).open_loans, 2)
+        self.assertEqual(LoanCirculation.objects.get(book=self.books[0]).reader, self.reader)
+        self.assertFalse(BookCirculation.objects.filter(book=self.books[2]).exists())
+
+        checkin_book(self.reader, self.books[0].id)
+        self.refresh()
+        self.assertEqual(ReaderCirculation.objects.get(reader=self.reader).open_loans, 1)
+        snapshot = BookCirculation.objects.get(book=self.books[0])
+        self.assertFalse(LoanCirculation.objects.filter(book=self.books[0]).exists())
+        self.assertEqual(snapshot.loan_count, 1)
+        self.assertEqual(snapshot.last_returned_date, timezone.localdate())
+
+        checkin_book(self.reader, self.books[1].id)
+        self.refresh()
+        self.assertFalse(ReaderCirculation.objects.exists())
+
+    def test_only_changed_loans_are_read(self):
+        checkout_book(self.reader, self.books[0].id)
+        self.refresh()
+        # A loan the incremental refresh cannot see: its updated_at is older than the last refresh.
+        borrowing = Borrowing.objects.create(reader=self.reader, book=self.books[1])
+        Borrowing.objects.filter(pk=borrowing.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        self.refresh()
+        self.assertFalse(BookCirculation.objects.filter(book=self.books[1]).exists())
+
+        Borrowing.objects.filter(book=self.books[0]).delete()
+        self.refresh("--full")
+        self.assertEqual(list(BookCirculation.objects.values_list('book_id', flat=True)), [self.books[1].id])
+        self.assertEqual(ReaderCirculation.objects.get(reader=self.reader).open_loans, 1)
+
+
+class CompactBookHistoryCommandTest(TestCase):
+    def setUp(self):
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
+
+    def test_circulation_is_not_recorded(self):
+        self.book.available_copies = 0
+        self.book.save()
+        self.assertFalse(hasattr(self.book.history.first(), 'available_copies'))
+
+    def test_compact_removes_consecutive_duplicates(self):
+        self.book.save()
+        self.book.genre = Genre.objects.create(name="Other Genre")
+        self.book.save()
+        self.book.save()
+        self.assertEqual(self.book.history.count(), 4)
+
+        call_command('compact_book_history', stdout=StringIO())
+        self.assertEqual(list(self.book.history.order_by('history_date').values_list('history_type', 'genre__name')),
+                         [('+', "Test Genre"), ('~', "Other Genre")])
+
+    def test_compact_prunes_by_age_keeping_latest(self):
+        self.book.genre = Genre.objects.create(name="Other Genre")
+        self.book.save()
+        self.book.history.update(history_date=timezone.now() - timedelta(days=30))
+
+        call_command('compact_book_history', days=7, stdout=StringIO())
+        self.assertEqual(list(self.book.history.values_list('genre__name', flat=True)), ["Other Genre"])
+
+
+class SeedAndBenchCommandTest(TestCase):
+    def test_seed_library(self):
+        call_command('seed_library', books=50, readers=5, loans=200, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 50)
+        self.assertEqual(Reader.objects.count(), 5)
+        self.assertEqual(Borrowing.objects.count(), 200)
+
+        open_loans = Borrowing.objects.filter(returned_date__isnull=True)
+        self.assertEqual(Book.objects.filter(available_copies=0).count(), open_loans.count())
+        self.assertEqual(set(Book.objects.filter(available_copies=0).values_list('copies', flat=True)),
+                         set(open_loans.values_list('copy', flat=True)))
+        self.assertEqual(Copy.objects.count(), 50)
+        self.assertFalse(Borrowing.objects.filter(borrowed_date__gt=models.F('returned_date')).exists())
+        self.assertLess(Borrowing.objects.filter(borrowed_date=timezone.localdate()).count(), 200)
+
+        with self.assertRaises(CommandError):
+            call_command('seed_library', books=1, readers=1, loans=1, stdout=StringIO())
+
+    def test_bench_writes_results(self):
+        call_command('seed_library', books=20, readers=2, loans=10, stdout=StringIO())
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command('bench', requests=2, host='testserver', output=output.name, stdout=StringIO(), stderr=StringIO())
+            results = json.load(output)
+
+        self.assertEqual(set(results['routes']), {pattern.name for pattern in urlpatterns})
+        for route, result in results['routes'].items():
+            self.assertLess(max(map(int, result['status'])), 400, route)
+            self.assertGreater(result['p50_ms'], 0, route)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Connection pooling is PostgreSQL only")
+class BenchDbConnectionsCommandTest(TestCase):
+    def test_pooled_connections_are_returned(self):
+        out = StringIO()
+        call_command('bench_db_connections', modes=['pooled'], requests=20, threads=2, stdout=out)
+        self.assertIn("'checked_out': 0", out.getvalue())
+        self.assertIn("'requests': 20", out.getvalue())
+        self.assertIn("'timeouts': 0", out.getvalue())
+
 
 """
 Тесты для админ-панели
@@ -125,18 +1260,28 @@ class AdminPanelTest(TestCase):
         self.client = Client()
         self.admin_user = User.objects.create_superuser(username="admin", password="adminpass", email="admin@example.com")
         self.client.login(username="admin", password="adminpass")
-        self.book = Book.objects.create(title="Test Book", author="Test Author", genre="Test Genre")
+        self.book = create_book(title="Test Book", author="Test Author", genre="Test Genre")
 
     def test_book_admin_list(self):
         response = self.client.get(reverse('admin:library_app_book_changelist'))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Test Book")
 
+    def test_book_admin_search(self):
+        create_book(title="Other Book", author="Other Author", genre="Other Genre")
+        response = self.client.get(reverse('admin:library_app_book_changelist'), {'q': "test"})
+        self.assertContains(response, "Test Book")
+        self.assertNotContains(response, "Other Book")
+
     def test_book_admin_add(self):
         response = self.client.post(reverse('admin:library_app_book_add'), {
             'title': 'New Book',
-            'author': 'New Author',
-            'genre': 'New Genre',
+            'author': self.book.author_id,
+            'genre': self.book.genre_id,
+            'add_copies': 2,
+            'copies-TOTAL_FORMS': 0,
+            'copies-INITIAL_FORMS': 0,
         })
         self.assertEqual(response.status_code, 302)
-        self.assertTrue(Book.objects.filter(title="New Book").exists())
+        book = Book.objects.get(title="New Book")
+        self.assertEqual((book.total_copies, book.available_copies, book.copies.count()), (2, 2, 2))
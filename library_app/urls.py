@@ -14,7 +14,17 @@ urlpatterns = [
     path('librarian/login/', views.librarian_login, name='librarian_login'),
     path('librarian/dashboard/', views.librarian_dashboard, name='librarian_dashboard'),
     path('api/books/', views.BookListView.as_view(), name='api_book_list'),
+    path('api/books/search/', views.BookSearchView.as_view(), name='api_book_search'),
     path('api/borrow/<int:book_id>/', views.BorrowBookView.as_view(), name='api_borrow_book'),
     path('api/return/<int:book_id>/', views.ReturnBookView.as_view(), name='api_return_book'),
+    path('api/borrow/batch/', views.BatchBorrowView.as_view(), name='api_borrow_batch'),
+    path('api/return/batch/', views.BatchReturnView.as_view(), name='api_return_batch'),
     path('api/my_books/', views.MyBooksView.as_view(), name='api_my_books'),
+    path('async/', views.home_async, name='home_async'),
+    path('api/async/books/', views.book_list_async, name='api_book_list_async'),
+    path('api/async/my_books/', views.my_books_async, name='api_my_books_async'),
+    path('api/export/books/', views.BookExportView.as_view(), name='api_export_books'),
+    path('api/export/borrowings/', views.BorrowingExportView.as_view(), name='api_export_borrowings'),
+    path('api/stats/', views.StatsView.as_view(), name='api_stats'),
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
 ]
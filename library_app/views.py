@@ -1,37 +1,125 @@
+from datetime import date, timedelta
+from functools import wraps
+
+from django.conf import settings
+from asgiref.sync import sync_to_async
+
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from django.db.models import Exists, OuterRef, Value
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.contrib.auth.decorators import user_passes_test
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
-
-from drf_spectacular.utils import extend_schema
-
+from rest_framework import status, serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.settings import api_settings
+
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, inline_serializer, OpenApiParameter
+
+from . import metrics
+from .authentication import token_reader
+from .circulation import circulation_stats, overdue_loans, overdue_readers, snapshot_time
 from .models import Book, Borrowing, Reader
 from .forms import ReaderRegistrationForm
-from .serializers import BookSerializer, BorrowingSerializer
+from .serializers import (BookSerializer, BookSearchSerializer, BorrowingSerializer, BorrowingValuesSerializer,
+                          BookIdsSerializer, BatchItemSerializer)
+from .pagination import KeysetPagination, SearchPagination
+from .search import search_books
+from .expressions import days_since
+from .exports import STREAMS, book_rows, borrowing_rows
+from .facets import FACETS, count_facets, facet_queryset, filter_books, parse_book_filters, parse_facets
+from .permissions import IsLibrarian
+from .renderers import CSVRenderer, NDJSONRenderer, FastJSONRenderer, PrometheusRenderer
+from .routers import pin_to_primary, replica_reads
+from .services import CirculationError, borrow_books, return_books, checkout_book, checkin_book
+from .cache import (CATALOG_CACHE_TIMEOUT, aget_catalog_version, catalog_cache_key, catalog_etag,
+                    catalog_facets_cache_key)
+
+
+# Readers listed above the overdue loans on the librarian dashboard.
+DASHBOARD_READERS = 20
+# Most borrowed books returned by /api/stats/.
+STATS_DEFAULT_TOP = 10
+STATS_MAX_TOP = 100
+# Set on the redirect after a borrow or return, so the page it leads to reads the change back from the primary.
+READ_PRIMARY_COOKIE = 'read_primary'
+READ_PRIMARY_MAX_AGE = 60
+FACET_VALUE_FIELDS = {
+    'id': serializers.IntegerField(),
+    'name': serializers.CharField(),
+    'count': serializers.IntegerField(),
+}
+
+
+def catalog_queryset(user):
+
+    if user.is_authenticated:
+        is_borrowed = Exists(Borrowing.objects.filter(book=OuterRef('pk'),
+                                                      reader__user=user,
+                                                      returned_date__isnull=True))
+    else:
+        is_borrowed = Value(False)
 
+    return Book.objects.select_related('author', 'genre').annotate(is_borrowed=is_borrowed)
 
-def home(request):
-    books = Book.objects.all().order_by('title')
 
-    for book in books:
-        book.is_borrowed = request.user.is_authenticated and Borrowing.objects.filter(book=book,
-                                                                                      reader__user=request.user,
-                                                                                      returned_date__isnull=True).exists()
+def redirect_after_write(to):
+    response = redirect(to)
+    response.set_cookie(READ_PRIMARY_COOKIE, '1', max_age=READ_PRIMARY_MAX_AGE, httponly=True, samesite='Lax')
+
+    return response
+
+
+def replica_reads_after_writes(view):
+    """``replica_reads()`` for a view, except on the request that follows ``redirect_after_write()``."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+
+        if not request.COOKIES.get(READ_PRIMARY_COOKIE):
 
-    return render(request, 'home.html', {'books': books})
+            with replica_reads():
+
+                return view(request, *args, **kwargs)
+
+        with pin_to_primary():
+            response = view(request, *args, **kwargs)
+
+        response.delete_cookie(READ_PRIMARY_COOKIE, samesite='Lax')
+
+        return response
+
+    return wrapper
+
+
+@replica_reads_after_writes
+def home(request):
+    paginator = KeysetPagination()
+    books = paginator.paginate_queryset(catalog_queryset(request.user), request)
+
+    return render(request, 'home.html', {'books': books, 'paginator': paginator})
 
 
 @login_required
+@replica_reads()
 def book_list(request):
-    books = Book.objects.all()
+    paginator = KeysetPagination()
+    books = paginator.paginate_queryset(Book.objects.select_related('author', 'genre'), request)
 
-    return render(request, 'book_list.html', {'books': books})
+    return render(request, 'book_list.html', {'books': books, 'paginator': paginator})
 
 
 def register(request):
@@ -69,11 +157,17 @@ def user_login(request):
 
 @login_required
 def my_books(request):
-    reader = Reader.objects.get(user=request.user)
-    borrowings = Borrowing.objects.filter(reader=reader, returned_date__isnull=True).order_by('book__title')
 
-    for borrowing in borrowings:
-        borrowing.days_borrowed = (timezone.now().date() - borrowing.borrowed_date).days
+    if not request.reader:
+
+        return redirect('home')
+
+    borrowings = (
+        Borrowing.objects.filter(reader=request.reader, returned_date__isnull=True)
+        .select_related('book')
+        .annotate(days_borrowed=days_since('borrowed_date'))
+        .order_by('book__title')
+    )
 
     return render(request, 'my_books.html', {'borrowings': borrowings})
 
@@ -85,32 +179,35 @@ def user_logout(request):
 
 
 @login_required
+@pin_to_primary()
 def borrow_book(request, book_id):
 
-    if not request.user.is_reader:
+    if not request.user.is_reader or not request.reader:
 
         return redirect('home')
 
-    book = Book.objects.get(id=book_id)
-    reader = Reader.objects.get(user=request.user)
-    Borrowing.objects.create(reader=reader, book=book)
-    book.is_checked_out = True
-    book.save()
+    try:
+        checkout_book(request.reader, book_id)
+    except CirculationError:
+        pass
 
-    return redirect('home')
+    return redirect_after_write('home')
 
 
 @login_required
+@pin_to_primary()
 def return_book(request, book_id):
-    book = Book.objects.get(id=book_id)
-    reader = Reader.objects.get(user=request.user)
-    borrowing = Borrowing.objects.get(book=book, reader=reader, returned_date__isnull=True)
-    borrowing.returned_date = timezone.now()
-    borrowing.save()
-    book.is_checked_out = False
-    book.save()
 
-    return redirect('home')
+    if not request.reader:
+
+        return redirect('home')
+
+    try:
+        checkin_book(request.reader, book_id)
+    except CirculationError:
+        pass
+
+    return redirect_after_write('home')
 
 
 def librarian_login(request):
@@ -132,27 +229,131 @@ def librarian_login(request):
 
 
 @user_passes_test(lambda u: u.is_librarian)
+@replica_reads()
 def librarian_dashboard(request):
-    overdue_borrowings = Borrowing.objects.filter(returned_date__isnull=True)
-
-    for borrowing in overdue_borrowings:
-        borrowing.days_overdue = borrowing.days_borrowed()
 
-    return render(request, 'librarian_dashboard.html', {'overdue_borrowings': overdue_borrowings})
+    today = timezone.localdate()
+
+    try:
+        # No loan is older than date.min, so larger values show the same loans.
+        min_days = min(max(int(request.GET['min_days']), 0), (today - date.min).days)
+    except (KeyError, ValueError):
+        min_days = settings.OVERDUE_THRESHOLD_DAYS
+
+    # Snapshot data by default, live data on request or before the first refresh.
+    refreshed_at = None if request.GET.get('live') == '1' else snapshot_time()
+    live = refreshed_at is None
+    # Oldest loans first is the same as most days overdue first, and stays on the open-loan index.
+    cutoff = today - timedelta(days=min_days)
+    overdue_borrowings, ordering = overdue_loans(cutoff, live=live)
+    paginator = KeysetPagination(ordering=ordering)
+    overdue_borrowings = paginator.paginate_queryset(overdue_borrowings, request)
+
+    return render(request, 'librarian_dashboard.html', {
+        'overdue_borrowings': overdue_borrowings,
+        'overdue_readers': overdue_readers(cutoff, live=live)[:DASHBOARD_READERS],
+        'min_days': min_days,
+        'live': live,
+        'refreshed_at': refreshed_at,
+        'paginator': paginator,
+    })
 
 
 @extend_schema(
-    responses=BookSerializer(many=True),
-    description="Get a list of all books."
+    responses=inline_serializer('PaginatedBookList', fields={
+        'next': serializers.URLField(allow_null=True),
+        'previous': serializers.URLField(allow_null=True),
+        'results': BookSerializer(many=True),
+        'facets': inline_serializer('BookFacets', required=False, fields={
+            'genre': inline_serializer('GenreFacet', fields=FACET_VALUE_FIELDS, many=True, required=False),
+            'author': inline_serializer('AuthorFacet', fields=FACET_VALUE_FIELDS, many=True, required=False),
+            'available': inline_serializer('AvailableFacet', many=True, required=False, fields={
+                'value': serializers.BooleanField(),
+                'count': serializers.IntegerField(),
+            }),
+        }),
+    }),
+    parameters=[
+        OpenApiParameter('cursor', str, description="Opaque cursor from a previous 'next' or 'previous' link."),
+        OpenApiParameter('page_size', int, description="Number of books per page."),
+        OpenApiParameter('genre', str, description="Comma-separated genre ids; books in any of them."),
+        OpenApiParameter('author', str, description="Comma-separated author ids; books by any of them."),
+        OpenApiParameter('available', bool, description="Only books that are, or are not, checked out."),
+        OpenApiParameter('facets', str, description=f"Comma-separated facets to count books by: "
+                                                    f"{', '.join(FACETS)}. Each facet is counted with the "
+                                                    f"filters on the other facets applied, but not its own."),
+    ],
+    description="Get a page of books ordered by title, optionally filtered and with facet counts."
 )
+@method_decorator(condition(etag_func=catalog_etag), name='get')
+# Pages and facet counts are cached under the current catalog version, so they are read from the primary:
+# a replica may not have seen the checkout or return that bumped the version yet.
+@method_decorator(pin_to_primary(), name='get')
 class BookListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        books = Book.objects.all()
-        serializer = BookSerializer(books, many=True)
+        filters = parse_book_filters(request.query_params)
+        facets = parse_facets(request.query_params)
+        key = catalog_cache_key(request)
+        data = cache.get(key)
+
+        if data is None:
+            paginator = KeysetPagination()
+            books = paginator.paginate_queryset(
+                filter_books(Book.objects.select_related('author', 'genre'), filters), request, view=self
+            )
+            serializer = BookSerializer(books, many=True)
+            data = paginator.get_paginated_data(serializer.data)
+            cache.set(key, data, CATALOG_CACHE_TIMEOUT)
+
+        if facets:
+            # Cached apart from the page, so paging through a filtered list counts once.
+            facets_key = catalog_facets_cache_key(filters, facets)
+            counts = cache.get(facets_key)
+
+            if counts is None:
+                counts = count_facets(facet_queryset(Book.objects.all(), filters, facets), filters, facets)
+                cache.set(facets_key, counts, CATALOG_CACHE_TIMEOUT)
 
-        return Response(serializer.data)
+            data = {**data, 'facets': counts}
+
+        return Response(data)
+
+
+@extend_schema(
+    responses=BookSearchSerializer(many=True),
+    parameters=[
+        OpenApiParameter('q', str, required=True, description="Words to look for in title, author and genre."),
+        OpenApiParameter('limit', int, description="Number of results per page."),
+        OpenApiParameter('offset', int, description="Index of the first result."),
+    ],
+    description="Full-text search over books, best matches first."
+)
+@method_decorator(replica_reads(), name='get')
+class BookSearchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+
+        if not query:
+
+            return Response({'error': 'Query parameter "q" is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = SearchPagination()
+        books = paginator.paginate_queryset(
+            search_books(query, Book.objects.select_related('author', 'genre')), request, view=self
+        )
+        serializer = BookSearchSerializer(books, many=True)
+
+        return paginator.get_paginated_response(serializer.data)
+
+
+def circulation_error_response(error):
+    error_status = status.HTTP_404_NOT_FOUND if error.not_found else status.HTTP_400_BAD_REQUEST
+
+    return Response({'error': error.message}, status=error_status)
 
 
 @extend_schema(
@@ -161,30 +362,23 @@ class BookListView(APIView):
     request=None,
     methods=['POST']
 )
+@method_decorator(pin_to_primary(), name='post')
 class BorrowBookView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, book_id):
 
-        try:
-            book = Book.objects.get(id=book_id)
-        except Book.DoesNotExist:
+        reader = request.reader
 
-            return Response({'error': 'Book not found'}, status=status.HTTP_404_NOT_FOUND)
+        if not reader:
 
-        if book.is_checked_out:
-
-            return Response({'error': 'Book is already borrowed'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'error': 'Reader not found'}, status=status.HTTP_404_NOT_FOUND)
 
         try:
-            reader = Reader.objects.get(user=request.user)
-        except Reader.DoesNotExist:
+            borrowing = checkout_book(reader, book_id)
+        except CirculationError as error:
 
-            return Response({'error': 'Reader not found'}, status=status.HTTP_404_NOT_FOUND)
-
-        borrowing = Borrowing.objects.create(reader=reader, book=book)
-        book.is_checked_out = True
-        book.save()
+            return circulation_error_response(error)
 
         serializer = BorrowingSerializer(borrowing)
 
@@ -197,41 +391,73 @@ class BorrowBookView(APIView):
     request=None,
     methods=['POST']
 )
+@method_decorator(pin_to_primary(), name='post')
 class ReturnBookView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, book_id):
 
+        reader = request.reader
+
+        if not reader:
+
+            return Response({'error': 'Reader not found'}, status=status.HTTP_404_NOT_FOUND)
+
         try:
-            book = Book.objects.get(id=book_id)
-        except Book.DoesNotExist:
+            borrowing = checkin_book(reader, book_id)
+        except CirculationError as error:
+
+            return circulation_error_response(error)
+
+        serializer = BorrowingSerializer(borrowing)
 
-            return Response({'error': 'Book not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-        if not book.is_checked_out:
 
-            return Response({'error': 'Book is not borrowed'}, status=status.HTTP_400_BAD_REQUEST)
+@method_decorator(pin_to_primary(), name='post')
+class BatchCirculationView(APIView):
+    permission_classes = [IsAuthenticated]
+    service = None
 
-        try:
-            reader = Reader.objects.get(user=request.user)
-        except Reader.DoesNotExist:
+    def post(self, request):
+        serializer = BookIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        reader = request.reader
+
+        if not reader:
 
             return Response({'error': 'Reader not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        try:
-            borrowing = Borrowing.objects.get(reader=reader, book=book, returned_date__isnull=True)
-        except Borrowing.DoesNotExist:
+        result = self.service(reader, serializer.validated_data['book_ids'])
+        items = []
 
-            return Response({'error': 'Borrowing record not found'}, status=status.HTTP_404_NOT_FOUND)
+        for book_id, borrowing, error in result.items():
 
-        borrowing.returned_date = timezone.now()
-        borrowing.save()
-        book.is_checked_out = False
-        book.save()
+            if borrowing is not None:
+                items.append({'book_id': book_id, 'success': True, 'borrowing': BorrowingSerializer(borrowing).data})
+            else:
+                items.append({'book_id': book_id, 'success': False, 'error': error})
 
-        serializer = BorrowingSerializer(borrowing)
+        return Response({'results': items}, status=status.HTTP_200_OK)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+
+@extend_schema(
+    request=BookIdsSerializer,
+    responses=inline_serializer('BatchBorrowResult', fields={'results': BatchItemSerializer(many=True)}),
+    description="Borrow several books in one transaction and report the outcome per book."
+)
+class BatchBorrowView(BatchCirculationView):
+    service = staticmethod(borrow_books)
+
+
+@extend_schema(
+    request=BookIdsSerializer,
+    responses=inline_serializer('BatchReturnResult', fields={'results': BatchItemSerializer(many=True)}),
+    description="Return several books in one transaction and report the outcome per book."
+)
+class BatchReturnView(BatchCirculationView):
+    service = staticmethod(return_books)
 
 
 @extend_schema(
@@ -243,13 +469,273 @@ class MyBooksView(APIView):
 
     def get(self, request):
 
-        try:
-            reader = Reader.objects.get(user=request.user)
-        except Reader.DoesNotExist:
+        reader = request.reader
+
+        if not reader:
 
             return Response({'error': 'Reader not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        borrowings = Borrowing.objects.filter(reader=reader, returned_date__isnull=True)
-        serializer = BorrowingSerializer(borrowings, many=True)
+        borrowings = Borrowing.objects.filter(reader=reader, returned_date__isnull=True).order_by('borrowed_date', 'id')
+        serializer = BorrowingValuesSerializer(borrowings)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+def parse_date_param(request, param, default=None):
+    value = request.query_params.get(param)
+
+    if not value:
+
+        return default
+
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+
+    if date is None:
+
+        raise ValidationError({param: 'Expected a date in YYYY-MM-DD format.'})
+
+    return date
+
+
+@method_decorator(replica_reads(), name='get')
+class ExportView(APIView):
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+    filename = None
+    # Subclasses set rows to a function from exports.py returning the header and a values_list() queryset;
+    # the date parameters are parsed from the query string and passed to it by name.
+    rows = None
+    date_params = ()
+
+    def get(self, request):
+        dates = {param: parse_date_param(request, param) for param in self.date_params}
+        header, queryset = self.rows(**dates)
+        # The stream is read after this method returns; choose the database while replica reads apply.
+        queryset = queryset.using(queryset.db)
+        renderer = request.accepted_renderer
+        stream = STREAMS[renderer.format](header, queryset)
+        response = StreamingHttpResponse(stream, content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}.{renderer.format}"'
+
+        return response
+
+
+@extend_schema(
+    responses={(200, 'text/csv'): OpenApiTypes.STR, (200, 'application/x-ndjson'): OpenApiTypes.STR},
+    description="Stream the whole catalog as CSV or NDJSON (?format=csv|ndjson)."
+)
+class BookExportView(ExportView):
+    permission_classes = [IsAuthenticated]
+    filename = 'books'
+    rows = staticmethod(book_rows)
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter('date_from', OpenApiTypes.DATE, description="Only loans borrowed on or after this date."),
+        OpenApiParameter('date_to', OpenApiTypes.DATE, description="Only loans borrowed on or before this date."),
+    ],
+    responses={(200, 'text/csv'): OpenApiTypes.STR, (200, 'application/x-ndjson'): OpenApiTypes.STR},
+    description="Stream the loan history as CSV or NDJSON (?format=csv|ndjson). Librarians only."
+)
+class BorrowingExportView(ExportView):
+    permission_classes = [IsLibrarian]
+    filename = 'borrowings'
+    rows = staticmethod(borrowing_rows)
+    date_params = ('date_from', 'date_to')
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter('date_from', OpenApiTypes.DATE, description="First day, 29 days before date_to by default."),
+        OpenApiParameter('date_to', OpenApiTypes.DATE, description="Last day, today by default."),
+        OpenApiParameter('top', OpenApiTypes.INT, description=f"Number of most borrowed books, up to {STATS_MAX_TOP}."),
+    ],
+    responses=inline_serializer('CirculationStats', fields={
+        'date_from': serializers.DateField(),
+        'date_to': serializers.DateField(),
+        'refreshed_at': serializers.DateTimeField(allow_null=True),
+        'most_borrowed': inline_serializer('MostBorrowedBook', fields={
+            'book_id': serializers.IntegerField(),
+            'title': serializers.CharField(),
+            'author': serializers.CharField(),
+            'loans': serializers.IntegerField(),
+        }, many=True),
+        'loans_per_genre': inline_serializer('GenreDayLoans', fields={
+            'day': serializers.DateField(),
+            'genre': serializers.CharField(),
+            'loans': serializers.IntegerField(),
+        }, many=True),
+        'average_loan_days': serializers.FloatField(allow_null=True),
+    }),
+    description="Loan statistics from the daily rollups, as of the last refresh_circulation_snapshot run. "
+                "Librarians only."
+)
+@method_decorator(replica_reads(), name='get')
+class StatsView(APIView):
+    permission_classes = [IsLibrarian]
+
+    def get(self, request):
+        date_to = parse_date_param(request, 'date_to', timezone.localdate())
+        date_from = parse_date_param(request, 'date_from', date_to - timedelta(days=29))
+
+        if date_from > date_to:
+
+            raise ValidationError({'date_from': 'Must not be after date_to.'})
+
+        try:
+            top = int(request.query_params.get('top', STATS_DEFAULT_TOP))
+        except ValueError:
+
+            raise ValidationError({'top': 'Expected an integer.'})
+
+        if not 0 < top <= STATS_MAX_TOP:
+
+            raise ValidationError({'top': f'Must be between 1 and {STATS_MAX_TOP}.'})
+
+        return Response({
+            'date_from': date_from,
+            'date_to': date_to,
+            'refreshed_at': snapshot_time(),
+            **circulation_stats(date_from, date_to, top),
+        })
+
+
+@extend_schema(
+    responses={(200, 'text/plain'): OpenApiTypes.STR},
+    description="Per-route request, latency, database and pool metrics in Prometheus text format. Staff only."
+)
+class MetricsView(APIView):
+    authentication_classes = [*api_settings.DEFAULT_AUTHENTICATION_CLASSES, SessionAuthentication]
+    permission_classes = [IsAdminUser]
+    renderer_classes = [PrometheusRenderer]
+
+    def get(self, request):
+
+        return Response(metrics.render(metrics.registry.collect()))
+
+
+"""
+Async read-only views for ASGI deployments. DRF views are sync-only, so these
+are plain Django views that authenticate with the configured DRF classes.
+"""
+
+
+def json_response(data, status=status.HTTP_200_OK):
+
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+async def aauthenticate(request):
+
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = await sync_to_async(authentication_class().authenticate)(request)
+
+        if result is not None:
+
+            return result
+
+    return None, None
+
+
+def api_login_required(view):
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+
+        try:
+            request.user, request.auth = await aauthenticate(request)
+        except AuthenticationFailed as error:
+
+            return json_response({'detail': str(error.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if request.user is None:
+
+            return json_response({'detail': 'Authentication credentials were not provided.'},
+                                 status=status.HTTP_401_UNAUTHORIZED)
+
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+async def home_async(request):
+    # Resolve the lazy session user up front; templates must not hit the database from the event loop.
+    request.user = await request.auser()
+    paginator = KeysetPagination()
+    books = await paginator.apaginate_queryset(catalog_queryset(request.user), request)
+
+    return render(request, 'home.html', {'books': books, 'paginator': paginator})
+
+
+@api_login_required
+async def book_list_async(request):
+    # As condition(etag_func=catalog_etag), which would look the catalog version up in a blocking call.
+    version = await aget_catalog_version()
+    etag = quote_etag(catalog_etag(request, version=version))
+    response = get_conditional_response(request, etag=etag)
+
+    if response is None:
+        response = await book_list_async_response(request, version)
+
+    response.headers.setdefault('ETag', etag)
+
+    return response
+
+
+async def book_list_async_response(request, version):
+
+    try:
+        filters = parse_book_filters(request.GET)
+        facets = parse_facets(request.GET)
+    except ValidationError as error:
+
+        return json_response(error.detail, status=status.HTTP_400_BAD_REQUEST)
+
+    key = catalog_cache_key(request, version)
+    data = await cache.aget(key)
+
+    if data is None:
+        paginator = KeysetPagination()
+
+        # Read from the primary, as in BookListView.
+        with pin_to_primary():
+            books = await paginator.apaginate_queryset(
+                filter_books(Book.objects.select_related('author', 'genre'), filters), request
+            )
+
+        data = paginator.get_paginated_data(BookSerializer(books, many=True).data)
+        await cache.aset(key, data, CATALOG_CACHE_TIMEOUT)
+
+    if facets:
+        facets_key = catalog_facets_cache_key(filters, facets, version)
+        counts = await cache.aget(facets_key)
+
+        if counts is None:
+
+            with pin_to_primary():
+                rows = [row async for row in facet_queryset(Book.objects.all(), filters, facets)]
+
+            counts = count_facets(rows, filters, facets)
+            await cache.aset(facets_key, counts, CATALOG_CACHE_TIMEOUT)
+
+        data = {**data, 'facets': counts}
+
+    return json_response(data)
+
+
+@api_login_required
+async def my_books_async(request):
+
+    try:
+        reader = token_reader(request) or await Reader.objects.aget(user=request.user)
+    except Reader.DoesNotExist:
+
+        return json_response({'error': 'Reader not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    borrowings = Borrowing.objects.filter(reader=reader, returned_date__isnull=True).order_by('borrowed_date', 'id')
+    results = await BorrowingValuesSerializer(borrowings).adata()
+
+    return json_response(results)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'library_app.apps.LibraryAppConfig',
     'rest_framework',
     'rest_framework_simplejwt',
@@ -46,11 +48,27 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'library_app.authentication.CachedJWTAuthentication',
+    ),
+    # orjson-backed JSON; falls back to the stdlib encoder when orjson is not installed.
+    'DEFAULT_RENDERER_CLASSES': (
+        'library_app.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'library_app.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Access tokens carry is_reader, is_librarian and reader_id claims.
+
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'library_app.authentication.LibraryTokenObtainPairSerializer',
+}
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Library Project API',
     'DESCRIPTION': 'Library System',
@@ -61,11 +79,14 @@ SPECTACULAR_SETTINGS = {
 AUTH_USER_MODEL = 'library_app.User'
 
 MIDDLEWARE = [
+    # First, so its latency covers the rest of the stack.
+    'library_app.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'library_app.middleware.reader_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -94,17 +115,67 @@ WSGI_APPLICATION = 'library_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# DB_POOL=1 takes connections from a psycopg_pool pool per worker process (see
+# library_app/db_backends/postgresql). Otherwise DB_CONN_MAX_AGE > 0 keeps one
+# persistent connection per thread.
+
+DB_POOL = os.environ.get('DB_POOL', '0') == '1'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'library_app.db_backends.postgresql',
         'NAME': 'library_db',
         'USER': 'test',
         'PASSWORD': '6245',
         'HOST': '127.0.0.1',
         'PORT': '5432',
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_HEALTH_CHECKS', '1') == '1',
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+                'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+                'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            },
+        } if DB_POOL else {},
     }
 }
 
+# DB_REPLICA_HOSTS=host1,host2 adds read replicas of the default database. Views
+# wrapped in library_app.routers.replica_reads() read from them.
+
+DATABASE_REPLICAS = []
+
+for number, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['library_app.routers.ReplicaRouter']
+
+
+# Cache
+# The catalog version key must be shared by all workers, so production deployments
+# should point CACHE_BACKEND/CACHE_LOCATION at Redis or Memcached.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+
+# Adds a fixed delay to every SQL query, for load tests of slow-database behaviour only.
+
+SIMULATED_DB_LATENCY_MS = int(os.environ.get('SIMULATED_DB_LATENCY_MS', 0))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -147,5 +218,39 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Session users are loaded together with their reader profile (request.reader). ModelBackend
+# stays listed so sessions created before ReaderModelBackend still load their user.
+
+AUTHENTICATION_BACKENDS = [
+    'library_app.authentication.ReaderModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 LOGIN_URL = 'login'
 LOGOUT_REDIRECT_URL = 'home'
+
+# Index historical tables on (history_date, id) so compact_book_history prunes by range.
+
+SIMPLE_HISTORY_DATE_INDEX = 'composite'
+
+# Catalog pagination
+# Clients may ask for a different page size with ?page_size=, capped at the maximum.
+
+CATALOG_PAGE_SIZE = 50
+CATALOG_MAX_PAGE_SIZE = 500
+
+# Loans open for at least this many days are listed on the librarian dashboard by default.
+
+OVERDUE_THRESHOLD_DAYS = 0
+
+# Users authenticated by token are kept in a per-process LRU cache for this many seconds.
+
+AUTH_USER_CACHE_SIZE = 1024
+AUTH_USER_CACHE_TTL = 60
+
+# Request metrics served at /metrics. Each worker process writes its counters to this directory
+# at most every METRICS_FLUSH_INTERVAL seconds, and /metrics sums them. Without a directory only
+# the process answering the scrape is reported.
+
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))